@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+from model_cache import get_download_root
+
+# Bytes hashed at the start, middle and end of a media file for its content key.
+_SAMPLE_BYTES = 1 << 20
+
+
+def hash_file(path):
+    """Fast content hash of a media file from its size and three sampled regions."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode("ascii"))
+    with open(path, "rb") as f:
+        if size <= 3 * _SAMPLE_BYTES:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - _SAMPLE_BYTES) // 2, size - _SAMPLE_BYTES):
+                f.seek(offset)
+                digest.update(f.read(_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def normalize_text(text):
+    """Unicode and whitespace normalisation applied before hashing cache keys."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TranslationCache:
+    """On-disk translation memory keyed by (normalised source text, target language).
+
+    Entries are stored in SQLite and evicted in least recently used order once the
+    cache holds more than `max_entries` translations. `hits` and `misses` count the
+    lookups made through this instance.
+    """
+
+    def __init__(self, path=None, max_entries=100_000):
+        self.path = path or os.path.join(get_download_root(), "translations.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # The connection is shared by the translation workers and guarded by the lock.
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS translations_last_used "
+                "ON translations (last_used)"
+            )
+
+    @staticmethod
+    def make_key(text, target):
+        data = f"{target}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, text, target):
+        key = self.make_key(text, target)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT translation FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE translations SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            return row[0]
+
+    def put(self, text, target, translation):
+        key = self.make_key(text, target)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO translations (key, translation, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, translation, time.time()),
+            )
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM translations"
+            ).fetchone()
+            if count > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM translations WHERE key IN ("
+                    "SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class TranscriptCache:
+    """On-disk cache of transcription results for media files that were already processed.
+
+    Results are keyed by the content hash, size and modification time of the file
+    together with the model, the language and the decoding options, and stored as
+    zlib-compressed JSON (start, end, text) rows in SQLite. The least recently used
+    results are evicted past `max_entries`. The translation target is not part of
+    the key, so changing it only re-runs the translation.
+    """
+
+    def __init__(self, path=None, max_entries=200):
+        self.path = path or os.path.join(get_download_root(), "transcripts.sqlite3")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(file_path, model_key, language=None, options=None):
+        stat = os.stat(file_path)
+        data = json.dumps(
+            [
+                hash_file(file_path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                model_key,
+                language,
+                options or {},
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns (segments, duration) for a cached result, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM transcripts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE transcripts SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        result = json.loads(zlib.decompress(row[0]))
+        return [tuple(segment) for segment in result["segments"]], result["duration"]
+
+    def put(self, key, segments, duration):
+        data = json.dumps(
+            {
+                "duration": duration,
+                "segments": [
+                    [round(start, 3), round(end, 3), text]
+                    for start, end, text in segments
+                ],
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        blob = zlib.compress(data.encode("utf-8"))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO transcripts (key, data, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._connection.execute(
+                "DELETE FROM transcripts WHERE key NOT IN ("
+                "SELECT key FROM transcripts ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
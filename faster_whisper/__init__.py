@@ -1,4 +1,4 @@
-from faster_whisper.audio import decode_audio
+from faster_whisper.audio import decode_audio, open_audio, stream_audio
 from faster_whisper.transcribe import BatchedInferencePipeline, WhisperModel
 from faster_whisper.utils import available_models, download_model, format_timestamp
 from faster_whisper.version import __version__
@@ -6,6 +6,8 @@ from faster_whisper.version import __version__
 __all__ = [
     "available_models",
     "decode_audio",
+    "open_audio",
+    "stream_audio",
     "WhisperModel",
     "BatchedInferencePipeline",
     "download_model",
@@ -10,7 +10,7 @@ import gc
 import io
 import itertools
 
-from typing import BinaryIO, Union
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
 
 import av
 import numpy as np
@@ -76,6 +76,122 @@ def decode_audio(
     return audio
 
 
+def stream_audio(
+    input_file: Union[str, BinaryIO],
+    sampling_rate: int = 16000,
+    chunk_seconds: float = 30,
+    split_stereo: bool = False,
+) -> Iterator[np.ndarray]:
+    """Decodes the audio incrementally.
+
+    Unlike `decode_audio`, the decoded signal is never materialized as a whole: the
+    memory usage only depends on `chunk_seconds`, not on the length of the input.
+
+    Args:
+      input_file: Path to the input file or a file-like object.
+      sampling_rate: Resample the audio to this sample rate.
+      chunk_seconds: Duration of the yielded blocks, the last block can be shorter.
+      split_stereo: Yield separate left and right channels.
+
+    Yields:
+      Float32 Numpy arrays of `chunk_seconds * sampling_rate` samples.
+
+      If `split_stereo` is enabled, 2-tuples with the separated left and right
+      channels are yielded instead.
+    """
+    blocks, _ = open_audio(input_file, sampling_rate, chunk_seconds, split_stereo)
+    yield from blocks
+
+
+def open_audio(
+    input_file: Union[str, BinaryIO],
+    sampling_rate: int = 16000,
+    chunk_seconds: float = 30,
+    split_stereo: bool = False,
+) -> Tuple[Iterator[np.ndarray], Optional[float]]:
+    """Opens an audio file, or the audio track of a video file, for streaming.
+
+    The duration is read from the container metadata, so the media is opened only
+    once and nothing is decoded before the blocks are consumed.
+
+    Args:
+      input_file: Path to the input file or a file-like object.
+      sampling_rate: Resample the audio to this sample rate.
+      chunk_seconds: Duration of the yielded blocks, the last block can be shorter.
+      split_stereo: Yield separate left and right channels.
+
+    Returns:
+      A 2-tuple with an iterator over the decoded blocks (see `stream_audio`) and the
+      duration in seconds, or None if the container does not declare it.
+    """
+    container = av.open(input_file, mode="r", metadata_errors="ignore")
+    try:
+        duration = _get_duration(container)
+    except Exception:
+        container.close()
+        raise
+
+    blocks = _decode_blocks(container, sampling_rate, chunk_seconds, split_stereo)
+    return blocks, duration
+
+
+def _get_duration(container) -> Optional[float]:
+    if not container.streams.audio:
+        raise ValueError("The input does not contain any audio stream")
+
+    stream = container.streams.audio[0]
+    if stream.duration is not None and stream.time_base is not None:
+        return float(stream.duration * stream.time_base)
+    if container.duration is not None:
+        return container.duration / av.time_base
+    return None
+
+
+def _decode_blocks(container, sampling_rate, chunk_seconds, split_stereo):
+    resampler = av.audio.resampler.AudioResampler(
+        format="s16",
+        layout="mono" if not split_stereo else "stereo",
+        rate=sampling_rate,
+    )
+    num_channels = 2 if split_stereo else 1
+    chunk_size = int(chunk_seconds * sampling_rate) * num_channels
+
+    def to_float32(array):
+        # Convert s16 back to f32.
+        audio = array.astype(np.float32) / 32768.0
+        if split_stereo:
+            return audio[0::2], audio[1::2]
+        return audio
+
+    with container:
+        frames = container.decode(audio=0)
+        frames = _ignore_invalid_frames(frames)
+        frames = _group_frames(frames, 500000)
+        frames = _resample_frames(frames, resampler)
+
+        arrays = []
+        buffered = 0
+        for frame in frames:
+            array = frame.to_ndarray().reshape(-1)
+            arrays.append(array)
+            buffered += array.shape[0]
+
+            if buffered >= chunk_size:
+                array = np.concatenate(arrays)
+                for start in range(0, buffered - chunk_size + 1, chunk_size):
+                    yield to_float32(array[start : start + chunk_size])
+                remainder = array[buffered - buffered % chunk_size :]
+                arrays = [remainder]
+                buffered = remainder.shape[0]
+
+        if buffered > 0:
+            yield to_float32(np.concatenate(arrays))
+
+    # See decode_audio: some resampler objects are only freed by the garbage collector.
+    del resampler
+    gc.collect()
+
+
 def _ignore_invalid_frames(frames):
     iterator = iter(frames)
 
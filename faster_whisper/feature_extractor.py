@@ -1,5 +1,13 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+# np.fft writes into preallocated outputs and keeps float32 inputs in single
+# precision since NumPy 2.0.
+_NUMPY_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
 
 class FeatureExtractor:
     def __init__(
@@ -20,6 +28,8 @@ class FeatureExtractor:
         self.mel_filters = self.get_mel_filters(
             sampling_rate, n_fft, n_mels=feature_size
         ).astype("float32")
+        self.window = np.hanning(n_fft + 1)[:-1].astype("float32")
+        self._workspaces = threading.local()
 
     @staticmethod
     def get_mel_filters(sr, n_fft, n_mels=128):
@@ -210,21 +220,255 @@ class FeatureExtractor:
         if padding:
             waveform = np.pad(waveform, (0, padding))
 
-        window = np.hanning(self.n_fft + 1)[:-1].astype("float32")
+        pad = self.n_fft // 2
+        waveform = np.pad(waveform, (pad, pad), mode="reflect")
+        log_spec = self.log_mel_spectrogram(waveform, drop_last=True)
+        np.maximum(log_spec, log_spec.max() - 8.0, out=log_spec)
+        log_spec += 4.0
+        log_spec /= 4.0
 
-        stft = self.stft(
-            waveform,
-            self.n_fft,
-            self.hop_length,
-            window=window,
-            return_complex=True,
-        ).astype("complex64")
-        magnitudes = np.abs(stft[..., :-1]) ** 2
+        return log_spec
 
-        mel_spec = self.mel_filters @ magnitudes
+    def log_mel_spectrogram(self, padded: np.ndarray, drop_last: bool = False):
+        """
+        Compute the unnormalized log-Mel spectrogram of already padded audio.
 
-        log_spec = np.log10(np.clip(mel_spec, a_min=1e-10, a_max=None))
-        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
-        log_spec = (log_spec + 4.0) / 4.0
+        The STFT runs in single precision over blocks of at most one chunk_length
+        window of frames, in per-thread workspaces reused across calls, and the power
+        is computed from the real and imaginary parts without an intermediate
+        magnitude. The last frame is not computed when `drop_last` is set.
+        """
+        n_frames = max(1 + (padded.shape[-1] - self.n_fft) // self.hop_length, 0)
+        if drop_last:
+            n_frames = max(n_frames - 1, 0)
+        frames = np.lib.stride_tricks.as_strided(
+            padded,
+            padded.shape[:-1] + (n_frames, self.n_fft),
+            padded.strides[:-1]
+            + (self.hop_length * padded.strides[-1], padded.strides[-1]),
+            writeable=False,
+        )
+        n_mels = self.mel_filters.shape[0]
+        log_spec = np.empty(padded.shape[:-1] + (n_mels, n_frames), dtype=np.float32)
 
-        return log_spec
+        batch_size = int(np.prod(padded.shape[:-1]))
+        block_size = max((self.nb_max_frames + 1) // batch_size, 1)
+        for start in range(0, n_frames, block_size):
+            block = frames[..., start : start + block_size, :]
+            mel_spec = self._power_spectrum(block) @ self.mel_filters.T
+            log_spec[..., start : start + block_size] = mel_spec.swapaxes(-1, -2)
+
+        np.maximum(log_spec, 1e-10, out=log_spec)
+        return np.log10(log_spec, out=log_spec)
+
+    def _power_spectrum(self, frames):
+        shape = frames.shape[:-1]
+        n_bins = self.n_fft // 2 + 1
+
+        windowed = self._workspace("windowed", shape + (self.n_fft,), np.float32)
+        np.multiply(frames, self.window, out=windowed)
+
+        if _NUMPY_FFT_OUT:
+            spectrum = self._workspace("spectrum", shape + (n_bins,), np.complex64)
+            np.fft.rfft(windowed, axis=-1, out=spectrum)
+        else:
+            spectrum = np.fft.rfft(windowed, axis=-1)
+
+        power = self._workspace("power", shape + (n_bins,), np.float32)
+        np.square(spectrum.real, out=power, casting="same_kind")
+        imag = self._workspace("imag", shape + (n_bins,), np.float32)
+        np.square(spectrum.imag, out=imag, casting="same_kind")
+        power += imag
+        return power
+
+    def _workspace(self, name, shape, dtype):
+        # Buffers are per thread since batches can be computed concurrently.
+        size = int(np.prod(shape))
+        buffer = getattr(self._workspaces, name, None)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(max(size, (self.nb_max_frames + 1) * shape[-1]), dtype)
+            setattr(self._workspaces, name, buffer)
+        return buffer[:size].reshape(shape)
+
+    def batch(self, chunks, batch_samples=None, num_workers=1):
+        """
+        Compute the log-Mel spectrograms of several audio chunks.
+
+        Returns an array of shape (n_chunks, n_mels, nb_max_frames) where each row is
+        the spectrogram of a chunk without its last frame, zero-padded or trimmed to
+        nb_max_frames, as expected by the encoder.
+
+        Chunks of similar lengths are zero-padded into batches of at most
+        `batch_samples` samples (one chunk_length window by default) that go through
+        a single STFT and Mel projection. Larger batches do not make the FFT faster
+        and no longer fit in the CPU caches. The batches run on `num_workers` threads.
+        """
+        batch_samples = batch_samples or self.n_samples
+        features = np.zeros(
+            (len(chunks), self.mel_filters.shape[0], self.nb_max_frames),
+            dtype=np.float32,
+        )
+
+        lengths = [len(chunk) for chunk in chunks]
+        batches = []
+        for index in np.argsort(lengths, kind="stable"):
+            # In increasing order of length, each chunk is the longest of its batch.
+            if batches and (len(batches[-1]) + 1) * lengths[index] <= batch_samples:
+                batches[-1].append(index)
+            else:
+                batches.append([index])
+
+        def process(indices):
+            self._batch_log_mel(
+                [chunks[i] for i in indices], [features[i] for i in indices]
+            )
+
+        if num_workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(num_workers) as executor:
+                list(executor.map(process, batches))
+        else:
+            for indices in batches:
+                process(indices)
+
+        return features
+
+    def _batch_log_mel(self, chunks, rows, padding=160):
+        lengths = np.array([len(chunk) for chunk in chunks])
+        waveforms = np.zeros((len(chunks), lengths.max() + padding), dtype=np.float32)
+        for waveform, chunk, length in zip(waveforms, chunks, lengths):
+            waveform[:length] = chunk
+
+        pad = self.n_fft // 2
+        waveforms = np.pad(waveforms, ((0, 0), (pad, pad)), mode="reflect")
+        log_spec = self.log_mel_spectrogram(waveforms, drop_last=True)
+
+        for row, chunk, chunk_log_spec, length in zip(rows, chunks, log_spec, lengths):
+            if length < self.n_fft:
+                # The end of short chunks is reflected into their own samples,
+                # which zero padding does not reproduce.
+                chunk_log_spec = self(chunk, padding)
+            else:
+                # The frames of a chunk only see zeros past its end, so they are
+                # not changed by the padding up to the length of the batch.
+                chunk_log_spec = chunk_log_spec[
+                    :, : (length + padding) // self.hop_length
+                ]
+                chunk_log_spec = np.maximum(chunk_log_spec, chunk_log_spec.max() - 8.0)
+                chunk_log_spec = (chunk_log_spec + 4.0) / 4.0
+            num_frames = min(chunk_log_spec.shape[-1] - 1, self.nb_max_frames)
+            row[:, :num_frames] = chunk_log_spec[:, :num_frames]
+
+
+class StreamingFeatureExtractor:
+    """
+    Incrementally compute the log-Mel spectrogram of an audio stream.
+
+    Only the STFT frames made complete by the appended samples are computed, so the
+    cost of `append` is proportional to the number of new samples. Once `finalize`
+    is called, `features()` matches `FeatureExtractor.__call__` on the concatenated
+    audio, within float rounding of the Mel projection. Before that, the last frames that would overlap the end
+    padding are not emitted yet and the normalization uses the running maximum.
+    """
+
+    def __init__(self, feature_extractor: FeatureExtractor, padding: int = 160):
+        self.feature_extractor = feature_extractor
+        self.padding = padding
+        self.n_fft = feature_extractor.n_fft
+        self.hop_length = feature_extractor.hop_length
+        self.reset()
+
+    def reset(self):
+        self._started = False
+        self._finalized = False
+        # Samples not consumed by a complete frame yet, including the left reflect padding.
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._frames = []
+        self._num_frames = 0
+        self._max = -np.inf
+
+    @property
+    def num_frames(self) -> int:
+        return self._num_frames
+
+    def append(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Append audio samples and return the new unnormalized log-Mel frames.
+        """
+        if self._finalized:
+            raise RuntimeError("Cannot append audio to a finalized stream")
+
+        samples = np.asarray(samples, dtype=np.float32)
+        self._pending = np.concatenate([self._pending, samples])
+
+        pad = self.n_fft // 2
+        if not self._started:
+            # The left reflect padding needs the first pad + 1 samples.
+            if len(self._pending) <= pad:
+                return self._empty_frames()
+            self._pending = np.concatenate(
+                [self._pending[1 : pad + 1][::-1], self._pending]
+            )
+            self._started = True
+
+        return self._consume(self._pending)
+
+    def finalize(self) -> np.ndarray:
+        """
+        Apply the end padding and return the last log-Mel frames.
+        """
+        if self._finalized:
+            return self._empty_frames()
+        self._finalized = True
+
+        if not self._started:
+            # Too short for incremental processing: compute the whole thing at once.
+            waveform = np.pad(self._pending, (0, self.padding))
+            frames = self._compute(
+                np.pad(waveform, self.n_fft // 2, mode="reflect"), drop_last=True
+            )
+            self._store(frames)
+            return frames
+
+        pad = self.n_fft // 2
+        pending = np.pad(self._pending, (0, self.padding))
+        pending = np.concatenate([pending, pending[-pad - 1 : -1][::-1]])
+        return self._consume(pending, drop_last=True)
+
+    def features(self, start_frame: int = 0) -> np.ndarray:
+        """
+        Return the normalized log-Mel spectrogram starting at `start_frame`.
+        """
+        if not self._frames:
+            return self._empty_frames()
+        if len(self._frames) > 1:
+            self._frames = [np.concatenate(self._frames, axis=1)]
+        log_spec = self._frames[0][:, start_frame:]
+        log_spec = np.maximum(log_spec, self._max - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def _consume(self, pending: np.ndarray, drop_last: bool = False) -> np.ndarray:
+        if len(pending) < self.n_fft:
+            self._pending = pending
+            return self._empty_frames()
+
+        n_frames = 1 + (len(pending) - self.n_fft) // self.hop_length
+        end = (n_frames - 1) * self.hop_length + self.n_fft
+        frames = self._compute(pending[:end], drop_last=drop_last)
+        self._pending = pending[n_frames * self.hop_length :]
+        self._store(frames)
+        return frames
+
+    def _compute(self, padded: np.ndarray, drop_last: bool = False) -> np.ndarray:
+        return self.feature_extractor.log_mel_spectrogram(padded, drop_last=drop_last)
+
+    def _store(self, frames: np.ndarray):
+        if frames.shape[-1] == 0:
+            return
+        self._frames.append(frames)
+        self._num_frames += frames.shape[-1]
+        self._max = max(self._max, float(frames.max()))
+
+    def _empty_frames(self) -> np.ndarray:
+        return np.zeros(
+            (self.feature_extractor.mel_filters.shape[0], 0), dtype=np.float32
+        )
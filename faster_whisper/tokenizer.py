@@ -1,4 +1,5 @@
 import string
+import weakref
 
 from functools import cached_property
 from typing import List, Optional, Tuple
@@ -90,6 +91,15 @@ class Tokenizer:
         text_tokens = [token for token in tokens if token < self.eot]
         return self.tokenizer.decode(text_tokens)
 
+    @cached_property
+    def token_bytes(self) -> List[bytes]:
+        """Raw UTF-8 bytes of each token id, shared by all wrappers of a vocabulary."""
+        token_bytes = _TOKEN_BYTES.get(self.tokenizer)
+        if token_bytes is None:
+            token_bytes = _build_token_bytes(self.tokenizer)
+            _TOKEN_BYTES[self.tokenizer] = token_bytes
+        return token_bytes
+
     def decode_with_timestamps(self, tokens: List[int]) -> str:
         outputs = [[]]
 
@@ -158,29 +168,42 @@ class Tokenizer:
         decoded_full = self.decode_with_timestamps(tokens)
         replacement_char = "\ufffd"
 
+        token_bytes = self.token_bytes
+        timestamp_begin = self.timestamp_begin
+
         words = []
         word_tokens = []
         current_tokens = []
         unicode_offset = 0
 
+        # The current word is decoded from the table like decode_with_timestamps would:
+        # the text up to its last timestamp, then the bytes of the tokens after it.
+        text = ""
+        pending = b""
+
         for token in tokens:
             current_tokens.append(token)
-            decoded = self.decode_with_timestamps(current_tokens)
-
-            try:
-                replacement_char_index = decoded.index(replacement_char)
-                replacement_char_index += unicode_offset
-            except ValueError:
-                replacement_char_index = None
-
-            if replacement_char_index is None or (
-                replacement_char_index < len(decoded_full)
-                and decoded_full[replacement_char_index] == replacement_char
+            if token >= timestamp_begin:
+                timestamp = f"<|{(token - timestamp_begin) * 0.02:.2f}|>"
+                text += pending.decode("utf-8", errors="replace") + timestamp
+                pending = b""
+                decoded = text
+            else:
+                pending += token_bytes[token]
+                decoded = text + pending.decode("utf-8", errors="replace")
+
+            replacement_char_index = decoded.find(replacement_char)
+            if replacement_char_index < 0 or (
+                replacement_char_index + unicode_offset < len(decoded_full)
+                and decoded_full[replacement_char_index + unicode_offset]
+                == replacement_char
             ):
                 words.append(decoded)
                 word_tokens.append(current_tokens)
                 current_tokens = []
                 unicode_offset += len(decoded)
+                text = ""
+                pending = b""
 
         return words, word_tokens
 
@@ -205,6 +228,47 @@ class Tokenizer:
         return words, word_tokens
 
 
+def _bytes_to_unicode():
+    # Printable characters the byte-level BPE vocabulary uses for each byte value.
+    bs = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    cs = bs[:]
+    n = 0
+    for b in range(2**8):
+        if b not in bs:
+            bs.append(b)
+            cs.append(2**8 + n)
+            n += 1
+    return dict(zip(bs, map(chr, cs)))
+
+
+_BYTE_DECODER = {char: byte for byte, char in _bytes_to_unicode().items()}
+
+_TOKEN_BYTES = weakref.WeakKeyDictionary()
+
+
+def _build_token_bytes(tokenizer: tokenizers.Tokenizer) -> List[bytes]:
+    added_tokens = tokenizer.get_added_tokens_decoder()
+    token_bytes = []
+
+    for token_id in range(tokenizer.get_vocab_size()):
+        if token_id in added_tokens:
+            # Special tokens are skipped when decoding, other added tokens are kept as is.
+            token_bytes.append(tokenizer.decode([token_id]).encode("utf-8"))
+            continue
+
+        token = tokenizer.id_to_token(token_id) or ""
+        if all(char in _BYTE_DECODER for char in token):
+            token_bytes.append(bytes(_BYTE_DECODER[char] for char in token))
+        else:
+            token_bytes.append(token.encode("utf-8"))
+
+    return token_bytes
+
+
 _TASKS = (
     "transcribe",
     "translate",
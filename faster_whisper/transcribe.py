@@ -1,13 +1,17 @@
+import copy
 import itertools
 import json
 import logging
 import os
+import queue
+import threading
 import zlib
 
-from dataclasses import asdict, dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
 from inspect import signature
 from math import ceil
-from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
 from warnings import warn
 
 import ctranslate2
@@ -24,10 +28,14 @@ from faster_whisper.vad import (
     SpeechTimestampsMap,
     VadOptions,
     collect_chunks,
+    gather_chunks,
     get_speech_timestamps,
     merge_segments,
 )
 
+# Number of 30-second windows held in memory when the audio is streamed.
+STREAM_BLOCK_WINDOWS = 10
+
 
 @dataclass
 class Word:
@@ -96,6 +104,9 @@ class TranscriptionOptions:
     clip_timestamps: Union[str, List[float]]
     hallucination_silence_threshold: Optional[float]
     hotwords: Optional[str]
+    speculative_fallback: int
+    speculative_encoding: bool
+    num_sections: int
 
 
 @dataclass
@@ -254,7 +265,7 @@ class BatchedInferencePipeline:
 
     def transcribe(
         self,
-        audio: Union[str, BinaryIO, np.ndarray],
+        audio: Union[str, BinaryIO, np.ndarray, Iterable[np.ndarray]],
         language: Optional[str] = None,
         task: str = "transcribe",
         log_progress: bool = False,
@@ -301,7 +312,11 @@ class BatchedInferencePipeline:
         """transcribe audio in chunks in batched fashion and return with language info.
 
         Arguments:
-            audio: Path to the input file (or a file-like object), or the audio waveform.
+            audio: Path to the input file (or a file-like object), the audio waveform, or an
+                iterator over waveform blocks such as the one returned by `stream_audio`.
+                Blocks are consumed lazily so the memory usage does not depend on the audio
+                length. In that case `vad_filter` must be enabled and `clip_timestamps` is
+                not supported.
             language: The language spoken in the audio. It should be a language code such
                 as "en" or "fr". If not set, the language will be detected in the first 30 seconds
                 of audio.
@@ -384,7 +399,19 @@ class BatchedInferencePipeline:
             )
             multilingual = False
 
-        if not isinstance(audio, np.ndarray):
+        audio_stream = None
+        if _is_audio_stream(audio):
+            if clip_timestamps or not vad_filter:
+                raise ValueError(
+                    "vad_filter is required and clip_timestamps is not supported when the "
+                    "audio is passed as an iterator of blocks"
+                )
+            audio_stream = iter(audio)
+            audio = _read_audio_blocks(
+                audio_stream,
+                STREAM_BLOCK_WINDOWS * self.model.feature_extractor.n_samples,
+            )
+        elif not isinstance(audio, np.ndarray):
             audio = decode_audio(audio, sampling_rate=sampling_rate)
         duration = audio.shape[0] / sampling_rate
 
@@ -409,8 +436,9 @@ class BatchedInferencePipeline:
                         **vad_parameters, max_speech_duration_s=chunk_length
                     )
 
-                active_segments = get_speech_timestamps(audio, vad_parameters)
-                clip_timestamps = merge_segments(active_segments, vad_parameters)
+                if audio_stream is None:
+                    active_segments = get_speech_timestamps(audio, vad_parameters)
+                    clip_timestamps = merge_segments(active_segments, vad_parameters)
             # run the audio if it is less than 30 sec even without clip_timestamps
             elif duration < chunk_length:
                 clip_timestamps = [{"start": 0, "end": audio.shape[0]}]
@@ -420,22 +448,30 @@ class BatchedInferencePipeline:
                     "Set 'vad_filter' to True or provide 'clip_timestamps'."
                 )
 
-        duration_after_vad = (
-            sum((segment["end"] - segment["start"]) for segment in clip_timestamps)
-            / sampling_rate
-        )
+        if audio_stream is not None:
+            # The VAD runs block by block while the stream is consumed.
+            duration_after_vad = 0.0
+            chunks_metadata = []
+            features = []
+        else:
+            duration_after_vad = (
+                sum((segment["end"] - segment["start"]) for segment in clip_timestamps)
+                / sampling_rate
+            )
 
-        self.model.logger.info(
-            "VAD filter removed %s of audio",
-            format_timestamp(duration - duration_after_vad),
-        )
+            self.model.logger.info(
+                "VAD filter removed %s of audio",
+                format_timestamp(duration - duration_after_vad),
+            )
 
-        audio_chunks, chunks_metadata = collect_chunks(audio, clip_timestamps)
-        features = (
-            [self.model.feature_extractor(chunk)[..., :-1] for chunk in audio_chunks]
-            if duration_after_vad
-            else []
-        )
+            audio_chunks, chunks_metadata = collect_chunks(audio, clip_timestamps)
+            features = (
+                self.model.feature_extractor.batch(
+                    audio_chunks, num_workers=os.cpu_count() or 1
+                )
+                if duration_after_vad
+                else []
+            )
 
         all_language_probs = None
         # detecting the language if not provided
@@ -443,23 +479,38 @@ class BatchedInferencePipeline:
             if not self.model.model.is_multilingual:
                 language = "en"
                 language_probability = 1
+            elif audio_stream is not None:
+                (
+                    language,
+                    language_probability,
+                    all_language_probs,
+                ) = self.model.detect_language(
+                    audio=audio,
+                    vad_filter=True,
+                    vad_parameters=vad_parameters,
+                    language_detection_segments=language_detection_segments,
+                    language_detection_threshold=language_detection_threshold,
+                )
             else:
                 (
                     language,
                     language_probability,
                     all_language_probs,
                 ) = self.model.detect_language(
-                    features=np.concatenate(
+                    # The padded chunk windows are classified directly, a dummy feature
+                    # accounts for empty audio.
+                    features=(
                         features
-                        + [
-                            np.full((self.model.model.n_mels, 1), -1.5, dtype="float32")
-                        ],
-                        axis=1,
-                    ),  # add a dummy feature to account for empty audio
+                        if len(features)
+                        else np.full(
+                            (self.model.model.n_mels, 1), -1.5, dtype="float32"
+                        )
+                    ),
                     language_detection_segments=language_detection_segments,
                     language_detection_threshold=language_detection_threshold,
                 )
 
+            if self.model.model.is_multilingual:
                 self.model.logger.info(
                     "Detected language '%s' with probability %.2f",
                     language,
@@ -482,10 +533,6 @@ class BatchedInferencePipeline:
             language=language,
         )
 
-        features = (
-            np.stack([pad_or_trim(feature) for feature in features]) if features else []
-        )
-
         options = TranscriptionOptions(
             beam_size=beam_size,
             best_of=best_of,
@@ -515,6 +562,9 @@ class BatchedInferencePipeline:
             hotwords=hotwords,
             word_timestamps=word_timestamps,
             hallucination_silence_threshold=None,
+            speculative_fallback=0,
+            speculative_encoding=False,
+            num_sections=1,
             condition_on_previous_text=False,
             clip_timestamps=clip_timestamps,
             prompt_reset_on_temperature=0.5,
@@ -533,17 +583,104 @@ class BatchedInferencePipeline:
             all_language_probs=all_language_probs,
         )
 
-        segments = self._batched_segments_generator(
-            features,
-            tokenizer,
-            chunks_metadata,
-            batch_size,
-            options,
-            log_progress,
-        )
+        if audio_stream is not None:
+            segments = self._streamed_segments_generator(
+                audio,
+                audio_stream,
+                tokenizer,
+                vad_parameters,
+                batch_size,
+                options,
+                log_progress,
+                info,
+            )
+        else:
+            segments = self._batched_segments_generator(
+                features,
+                tokenizer,
+                chunks_metadata,
+                batch_size,
+                options,
+                log_progress,
+            )
 
         return segments, info
 
+    def _streamed_segments_generator(
+        self,
+        audio,
+        audio_stream,
+        tokenizer,
+        vad_parameters,
+        batch_size,
+        options,
+        log_progress,
+        info,
+    ):
+        sampling_rate = self.model.feature_extractor.sampling_rate
+        block_size = STREAM_BLOCK_WINDOWS * self.model.feature_extractor.n_samples
+        if vad_parameters.num_shards > 1:
+            # The VAD only splits blocks holding 4 overlaps per shard, see
+            # SileroVADModel.sharded.
+            block_size = max(
+                block_size,
+                ceil(
+                    4
+                    * vad_parameters.num_shards
+                    * vad_parameters.shard_overlap_s
+                    * sampling_rate
+                ),
+            )
+        offset = 0
+        seg_idx = 0
+
+        while True:
+            read = _read_audio_blocks(audio_stream, block_size - audio.shape[0])
+            if read.shape[0] > 0:
+                audio = np.concatenate([audio, read])
+                info.duration += read.shape[0] / sampling_rate
+            is_last_block = audio.shape[0] < block_size
+
+            active_segments = get_speech_timestamps(audio, vad_parameters)
+            end = audio.shape[0]
+            if not is_last_block and active_segments and active_segments[-1]["start"]:
+                # The last speech chunk may continue in the next block.
+                end = active_segments.pop()["start"]
+            clip_timestamps = merge_segments(active_segments, vad_parameters)
+
+            if clip_timestamps:
+                info.duration_after_vad += (
+                    sum(
+                        segment["end"] - segment["start"] for segment in clip_timestamps
+                    )
+                    / sampling_rate
+                )
+                audio_chunks, chunks_metadata = collect_chunks(audio, clip_timestamps)
+                for chunk_metadata in chunks_metadata:
+                    chunk_metadata["start_time"] += offset / sampling_rate
+                    chunk_metadata["end_time"] += offset / sampling_rate
+                features = self.model.feature_extractor.batch(
+                    audio_chunks, num_workers=os.cpu_count() or 1
+                )
+
+                for segment in self._batched_segments_generator(
+                    features,
+                    tokenizer,
+                    chunks_metadata,
+                    batch_size,
+                    options,
+                    log_progress,
+                ):
+                    seg_idx += 1
+                    segment.id = seg_idx
+                    yield segment
+
+            if is_last_block:
+                break
+
+            audio = audio[end:]
+            offset += end
+
     def _batched_segments_generator(
         self, features, tokenizer, chunks_metadata, batch_size, options, log_progress
     ):
@@ -704,7 +841,7 @@ class WhisperModel:
 
     def transcribe(
         self,
-        audio: Union[str, BinaryIO, np.ndarray],
+        audio: Union[str, BinaryIO, np.ndarray, Iterable[np.ndarray]],
         language: Optional[str] = None,
         task: str = "transcribe",
         log_progress: bool = False,
@@ -746,11 +883,18 @@ class WhisperModel:
         hotwords: Optional[str] = None,
         language_detection_threshold: Optional[float] = 0.5,
         language_detection_segments: int = 1,
+        speculative_fallback: int = 0,
+        speculative_encoding: bool = False,
+        num_sections: int = 1,
     ) -> Tuple[Iterable[Segment], TranscriptionInfo]:
         """Transcribes an input file.
 
         Arguments:
-          audio: Path to the input file (or a file-like object), or the audio waveform.
+          audio: Path to the input file (or a file-like object), the audio waveform, or an
+            iterator over waveform blocks such as the one returned by `stream_audio`.
+            Blocks are consumed lazily so the memory usage does not depend on the audio
+            length. In that case `vad_filter` and `clip_timestamps` are not supported and
+            the duration reported in TranscriptionInfo grows as the blocks are read.
           language: The language spoken in the audio. It should be a language code such
             as "en" or "fr". If not set, the language will be detected in the first 30 seconds
             of audio.
@@ -815,6 +959,23 @@ class WhisperModel:
           language_detection_threshold: If the maximum probability of the language tokens is higher
            than this value, the language is detected.
           language_detection_segments: Number of segments to consider for the language detection.
+          speculative_fallback: Number of fallback temperatures decoded speculatively
+            together with the current one. The decodings are submitted at once and run
+            in parallel on the model workers (see num_workers), so a window that needs
+            the temperature fallback does not wait for each try in turn. The results
+            are checked in order and the remaining ones are discarded, so the extra
+            decodings only pay off when the model has spare workers and CPU cores.
+          speculative_encoding: Encode the next 30-second window on a background thread
+            while the current one is decoded. The next window usually starts where the
+            current one ends; when the decoded timestamps move it elsewhere, the
+            speculative encoding is discarded. The encodings only overlap when the
+            model has more than one worker (see num_workers).
+          num_sections: Split long audio at silences into this many sections that are
+            transcribed concurrently, each with its own prompt context, and merged in
+            order. The sections run in parallel on the model workers, so num_workers
+            should be at least num_sections. Only applies when clip_timestamps is not
+            set and the audio is not streamed, and each section spans at least one
+            30-second window.
         Returns:
           A tuple with:
 
@@ -830,7 +991,18 @@ class WhisperModel:
             )
             multilingual = False
 
-        if not isinstance(audio, np.ndarray):
+        audio_stream = None
+        if _is_audio_stream(audio):
+            if vad_filter or clip_timestamps != "0":
+                raise ValueError(
+                    "vad_filter and clip_timestamps are not supported when the audio "
+                    "is passed as an iterator of blocks"
+                )
+            audio_stream = iter(audio)
+            audio = _read_audio_blocks(
+                audio_stream, STREAM_BLOCK_WINDOWS * self.feature_extractor.n_samples
+            )
+        elif not isinstance(audio, np.ndarray):
             audio = decode_audio(audio, sampling_rate=sampling_rate)
 
         duration = audio.shape[0] / sampling_rate
@@ -846,8 +1018,7 @@ class WhisperModel:
             elif isinstance(vad_parameters, dict):
                 vad_parameters = VadOptions(**vad_parameters)
             speech_chunks = get_speech_timestamps(audio, vad_parameters)
-            audio_chunks, chunks_metadata = collect_chunks(audio, speech_chunks)
-            audio = np.concatenate(audio_chunks, axis=0)
+            audio = gather_chunks(audio, speech_chunks)
             duration_after_vad = audio.shape[0] / sampling_rate
 
             self.logger.info(
@@ -897,12 +1068,29 @@ class WhisperModel:
                     language,
                     language_probability,
                     all_language_probs,
+                    encoder_output,
                 ) = self.detect_language(
-                    features=features[..., seek:],
+                    # The trailing frame is excluded like in generate_segments,
+                    # unless it is the only one.
+                    features=features[..., seek : content_frames or None],
                     language_detection_segments=language_detection_segments,
                     language_detection_threshold=language_detection_threshold,
+                    return_encoder_output=True,
                 )
 
+                # The encoder output of the first window is reused for decoding when
+                # that window is the first one decoded by generate_segments.
+                if isinstance(clip_timestamps, str):
+                    clips = (
+                        [float(ts) for ts in clip_timestamps.split(",")]
+                        if clip_timestamps
+                        else []
+                    )
+                else:
+                    clips = list(clip_timestamps)
+                if seek != 0 or clips not in ([], [0]):
+                    encoder_output = None
+
                 self.logger.info(
                     "Detected language '%s' with probability %.2f",
                     language,
@@ -958,15 +1146,11 @@ class WhisperModel:
             clip_timestamps=clip_timestamps,
             hallucination_silence_threshold=hallucination_silence_threshold,
             hotwords=hotwords,
+            speculative_fallback=speculative_fallback,
+            speculative_encoding=speculative_encoding,
+            num_sections=num_sections,
         )
 
-        segments = self.generate_segments(
-            features, tokenizer, options, log_progress, encoder_output
-        )
-
-        if speech_chunks:
-            segments = restore_speech_timestamps(segments, speech_chunks, sampling_rate)
-
         info = TranscriptionInfo(
             language=language,
             language_probability=language_probability,
@@ -977,8 +1161,267 @@ class WhisperModel:
             all_language_probs=all_language_probs,
         )
 
+        if audio_stream is not None:
+            segments = self._generate_streamed_segments(
+                audio,
+                audio_stream,
+                tokenizer,
+                options,
+                log_progress,
+                info,
+                encoder_output,
+            )
+            return segments, info
+
+        section_boundaries = (
+            self._get_section_boundaries(
+                audio, speech_chunks, vad_parameters, num_sections
+            )
+            if num_sections > 1 and clip_timestamps == "0"
+            else []
+        )
+        if section_boundaries:
+            segments = self._generate_sectioned_segments(
+                features,
+                tokenizer,
+                options,
+                log_progress,
+                encoder_output,
+                section_boundaries,
+            )
+        else:
+            segments = self.generate_segments(
+                features, tokenizer, options, log_progress, encoder_output
+            )
+
+        if speech_chunks:
+            segments = restore_speech_timestamps(segments, speech_chunks, sampling_rate)
+
         return segments, info
 
+    def _generate_streamed_segments(
+        self,
+        audio: np.ndarray,
+        audio_stream: Iterator[np.ndarray],
+        tokenizer: Tokenizer,
+        options: TranscriptionOptions,
+        log_progress: bool,
+        info: TranscriptionInfo,
+        encoder_output: Optional[ctranslate2.StorageView] = None,
+    ) -> Iterable[Segment]:
+        sampling_rate = self.feature_extractor.sampling_rate
+        block_size = STREAM_BLOCK_WINDOWS * self.feature_extractor.n_samples
+        block_options = options
+        offset = 0
+        idx = 0
+        previous_tokens = []
+
+        while True:
+            read = _read_audio_blocks(audio_stream, block_size - audio.shape[0])
+            if read.shape[0] > 0:
+                audio = np.concatenate([audio, read])
+                info.duration += read.shape[0] / sampling_rate
+                info.duration_after_vad = info.duration
+                # The first window is no longer the one encoded for language detection.
+                encoder_output = None
+            is_last_block = audio.shape[0] < block_size
+
+            # Each block is decoded up to its last complete window, the remaining
+            # audio is carried over to the next block.
+            features = self.feature_extractor(audio)
+            segments = self.generate_segments(
+                features,
+                tokenizer,
+                block_options,
+                log_progress,
+                encoder_output,
+                partial=not is_last_block,
+            )
+            encoder_output = None
+            time_offset = offset / sampling_rate
+            seek_offset = offset // self.feature_extractor.hop_length
+
+            while True:
+                try:
+                    segment = next(segments)
+                except StopIteration as stop:
+                    seek = stop.value
+                    break
+
+                idx += 1
+                segment.id = idx
+                segment.seek += seek_offset
+                segment.start += time_offset
+                segment.end += time_offset
+                for word in segment.words or []:
+                    word.start += time_offset
+                    word.end += time_offset
+                previous_tokens.extend(segment.tokens)
+                yield segment
+
+            # Only the tail of the transcript is used in the prompt of the next block.
+            del previous_tokens[: -(self.max_length // 2 - 1)]
+
+            if is_last_block:
+                break
+
+            consumed = seek * self.feature_extractor.hop_length
+            audio = audio[consumed:]
+            offset += consumed
+
+            block_options = replace(
+                options,
+                prefix=None,
+                initial_prompt=(
+                    previous_tokens[-(self.max_length // 2 - 1) :]
+                    if options.condition_on_previous_text
+                    else None
+                ),
+            )
+
+    def _get_section_boundaries(
+        self,
+        audio: np.ndarray,
+        speech_chunks: Optional[List[dict]],
+        vad_parameters: Optional[Union[dict, VadOptions]],
+        num_sections: int,
+    ) -> List[int]:
+        """Returns the frames where the audio is split into sections.
+
+        The sections are cut at the silences closest to an even split and are never
+        shorter than a window. Without silences, or when the audio is too short,
+        fewer sections are used.
+        """
+        if speech_chunks is not None:
+            # The VAD filter already removed the silences between the speech chunks.
+            silences = list(
+                itertools.accumulate(
+                    chunk["end"] - chunk["start"] for chunk in speech_chunks
+                )
+            )[:-1]
+        else:
+            if vad_parameters is None:
+                vad_parameters = VadOptions()
+            elif isinstance(vad_parameters, dict):
+                vad_parameters = VadOptions(**vad_parameters)
+            chunks = get_speech_timestamps(audio, vad_parameters)
+            silences = [
+                (chunk["end"] + next_chunk["start"]) // 2
+                for chunk, next_chunk in zip(chunks, chunks[1:])
+            ]
+
+        num_samples = audio.shape[0]
+        n_samples = self.feature_extractor.n_samples
+        num_sections = min(num_sections, num_samples // n_samples)
+        boundaries = []
+        for index in range(1, num_sections):
+            if not silences:
+                break
+            target = num_samples * index // num_sections
+            boundary = min(silences, key=lambda silence: abs(silence - target))
+            if boundary - (boundaries[-1] if boundaries else 0) >= n_samples:
+                boundaries.append(boundary)
+
+        # A short last section is merged into the previous one.
+        if boundaries and num_samples - boundaries[-1] < n_samples:
+            boundaries.pop()
+
+        return [
+            boundary // self.feature_extractor.hop_length for boundary in boundaries
+        ]
+
+    def _generate_sectioned_segments(
+        self,
+        features: np.ndarray,
+        tokenizer: Tokenizer,
+        options: TranscriptionOptions,
+        log_progress: bool,
+        encoder_output: Optional[ctranslate2.StorageView],
+        boundaries: List[int],
+    ) -> Iterable[Segment]:
+        content_frames = features.shape[-1] - 1
+        edges = [0] + boundaries + [content_frames]
+        time_per_frame = self.feature_extractor.time_per_frame
+
+        stop_event = threading.Event()
+        section_queues = [queue.Queue() for _ in range(len(edges) - 1)]
+
+        def transcribe_section(index):
+            # Each section has its own prompt context and tokenizer state, and the
+            # language detection encoder output only matches the first window.
+            section_options = replace(
+                options,
+                clip_timestamps=[
+                    edges[index] * time_per_frame,
+                    edges[index + 1] * time_per_frame,
+                ],
+            )
+            try:
+                for segment in self.generate_segments(
+                    features,
+                    copy.copy(tokenizer),
+                    section_options,
+                    log_progress and index == 0,
+                    encoder_output if index == 0 else None,
+                    stop_event=stop_event,
+                ):
+                    section_queues[index].put(segment)
+            finally:
+                section_queues[index].put(None)
+
+        executor = ThreadPoolExecutor(max_workers=len(edges) - 1)
+        try:
+            futures = [
+                executor.submit(transcribe_section, index)
+                for index in range(len(edges) - 1)
+            ]
+
+            # The segments of a section are yielded as they are decoded once all the
+            # previous sections are done, the later sections are buffered meanwhile.
+            idx = 0
+            last_end = 0.0
+            for future, section_queue in zip(futures, section_queues):
+                previous_end = last_end
+                for segment in iter(section_queue.get, None):
+                    # The last timestamps of a section can run past its end: words
+                    # or segments centered before the end of the previous section
+                    # are duplicates.
+                    if segment.words:
+                        words = [
+                            word
+                            for word in segment.words
+                            if (word.start + word.end) / 2 >= previous_end
+                        ]
+                        if not words:
+                            continue
+                        if len(words) < len(segment.words):
+                            num_dropped = len(segment.words) - len(words)
+                            if segment.words[num_dropped:] == words:
+                                segment.tokens = _drop_word_tokens(
+                                    tokenizer,
+                                    segment.tokens,
+                                    segment.words[:num_dropped],
+                                )
+                            segment.words = words
+                            segment.text = "".join(word.word for word in words)
+                            segment.start = words[0].start
+                    elif (segment.start + segment.end) / 2 < previous_end:
+                        continue
+                    else:
+                        segment.start = max(segment.start, previous_end)
+
+                    idx += 1
+                    segment.id = idx
+                    last_end = max(last_end, segment.end)
+                    yield segment
+
+                # Raises the error of a failed section.
+                future.result()
+        finally:
+            # The running sections stop before their next window.
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def _split_segments_by_timestamps(
         self,
         tokenizer: Tokenizer,
@@ -1065,9 +1508,15 @@ class WhisperModel:
         options: TranscriptionOptions,
         log_progress,
         encoder_output: Optional[ctranslate2.StorageView] = None,
+        partial: bool = False,
+        stop_event: Optional[threading.Event] = None,
     ) -> Iterable[Segment]:
+        # When `partial` is set, the generation stops before the first incomplete window
+        # and the generator returns the seek position where the decoding should resume.
+        # When `stop_event` is set, the generation stops before the next window.
         content_frames = features.shape[-1] - 1
         content_duration = float(content_frames * self.feature_extractor.time_per_frame)
+        precomputed_encoder_output = encoder_output
 
         if isinstance(options.clip_timestamps, str):
             options.clip_timestamps = [
@@ -1106,245 +1555,298 @@ class WhisperModel:
             else:
                 all_tokens.extend(options.initial_prompt)
 
+        def encode_window(start, size):
+            return self.encode(pad_or_trim(features[:, start : start + size]))
+
+        # Encoding of the window expected after the current one, as (seek, size, future).
+        encoder_executor = (
+            ThreadPoolExecutor(max_workers=1) if options.speculative_encoding else None
+        )
+        next_window = None
+
         pbar = tqdm(total=content_duration, unit="seconds", disable=not log_progress)
         last_speech_timestamp = 0.0
-        # NOTE: This loop is obscurely flattened to make the diff readable.
-        # A later commit should turn this into a simpler nested loop.
-        # for seek_clip_start, seek_clip_end in seek_clips:
-        #     while seek < seek_clip_end
-        while clip_idx < len(seek_clips):
-            seek_clip_start, seek_clip_end = seek_clips[clip_idx]
-            if seek_clip_end > content_frames:
-                seek_clip_end = content_frames
-            if seek < seek_clip_start:
-                seek = seek_clip_start
-            if seek >= seek_clip_end:
-                clip_idx += 1
-                if clip_idx < len(seek_clips):
-                    seek = seek_clips[clip_idx][0]
-                continue
-            time_offset = seek * self.feature_extractor.time_per_frame
-            window_end_time = float(
-                (seek + self.feature_extractor.nb_max_frames)
-                * self.feature_extractor.time_per_frame
-            )
-            segment_size = min(
-                self.feature_extractor.nb_max_frames,
-                content_frames - seek,
-                seek_clip_end - seek,
-            )
-            segment = features[:, seek : seek + segment_size]
-            segment_duration = segment_size * self.feature_extractor.time_per_frame
-            segment = pad_or_trim(segment)
-
-            if self.logger.isEnabledFor(logging.DEBUG):
-                self.logger.debug(
-                    "Processing segment at %s", format_timestamp(time_offset)
+        try:
+            # NOTE: This loop is obscurely flattened to make the diff readable.
+            # A later commit should turn this into a simpler nested loop.
+            # for seek_clip_start, seek_clip_end in seek_clips:
+            #     while seek < seek_clip_end
+            while clip_idx < len(seek_clips):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                seek_clip_start, seek_clip_end = seek_clips[clip_idx]
+                if seek_clip_end > content_frames:
+                    seek_clip_end = content_frames
+                if seek < seek_clip_start:
+                    seek = seek_clip_start
+                if seek >= seek_clip_end:
+                    clip_idx += 1
+                    if clip_idx < len(seek_clips):
+                        seek = seek_clips[clip_idx][0]
+                    continue
+                time_offset = seek * self.feature_extractor.time_per_frame
+                window_end_time = float(
+                    (seek + self.feature_extractor.nb_max_frames)
+                    * self.feature_extractor.time_per_frame
                 )
+                segment_size = min(
+                    self.feature_extractor.nb_max_frames,
+                    content_frames - seek,
+                    seek_clip_end - seek,
+                )
+                if partial and segment_size < self.feature_extractor.nb_max_frames:
+                    break
+                segment_duration = segment_size * self.feature_extractor.time_per_frame
 
-            previous_tokens = all_tokens[prompt_reset_since:]
-
-            if seek > 0 or encoder_output is None:
-                encoder_output = self.encode(segment)
-
-            if options.multilingual:
-                results = self.model.detect_language(encoder_output)
-                language_token, language_probability = results[0][0]
-                language = language_token[2:-2]
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(
+                        "Processing segment at %s", format_timestamp(time_offset)
+                    )
 
-                tokenizer.language = tokenizer.tokenizer.token_to_id(language_token)
-                tokenizer.language_code = language
+                previous_tokens = all_tokens[prompt_reset_since:]
 
-            prompt = self.get_prompt(
-                tokenizer,
-                previous_tokens,
-                without_timestamps=options.without_timestamps,
-                prefix=options.prefix if seek == 0 else None,
-                hotwords=options.hotwords,
-            )
+                # A precomputed encoder output only applies to the first decoded window.
+                if precomputed_encoder_output is not None:
+                    encoder_output = precomputed_encoder_output
+                    precomputed_encoder_output = None
+                elif next_window is not None and next_window[:2] == (
+                    seek,
+                    segment_size,
+                ):
+                    encoder_output = next_window[2].result()
+                else:
+                    encoder_output = encode_window(seek, segment_size)
+                next_window = None
+
+                if encoder_executor is not None:
+                    # Most windows end without a cut, so the next one starts right after.
+                    next_seek = seek + segment_size
+                    next_size = min(
+                        self.feature_extractor.nb_max_frames,
+                        content_frames - next_seek,
+                        seek_clip_end - next_seek,
+                    )
+                    if next_size > 0 and not (
+                        partial and next_size < self.feature_extractor.nb_max_frames
+                    ):
+                        next_window = (
+                            next_seek,
+                            next_size,
+                            encoder_executor.submit(
+                                encode_window, next_seek, next_size
+                            ),
+                        )
 
-            (
-                result,
-                avg_logprob,
-                temperature,
-                compression_ratio,
-            ) = self.generate_with_fallback(encoder_output, prompt, tokenizer, options)
+                if options.multilingual:
+                    results = self.model.detect_language(encoder_output)
+                    language_token, language_probability = results[0][0]
+                    language = language_token[2:-2]
 
-            if options.no_speech_threshold is not None:
-                # no voice activity check
-                should_skip = result.no_speech_prob > options.no_speech_threshold
+                    tokenizer.language = tokenizer.tokenizer.token_to_id(language_token)
+                    tokenizer.language_code = language
 
-                if (
-                    options.log_prob_threshold is not None
-                    and avg_logprob > options.log_prob_threshold
-                ):
-                    # don't skip if the logprob is high enough, despite the no_speech_prob
-                    should_skip = False
+                prompt = self.get_prompt(
+                    tokenizer,
+                    previous_tokens,
+                    without_timestamps=options.without_timestamps,
+                    prefix=options.prefix if seek == 0 else None,
+                    hotwords=options.hotwords,
+                )
 
-                if should_skip:
-                    self.logger.debug(
-                        "No speech threshold is met (%f > %f)",
-                        result.no_speech_prob,
-                        options.no_speech_threshold,
-                    )
+                (
+                    result,
+                    avg_logprob,
+                    temperature,
+                    compression_ratio,
+                ) = self.generate_with_fallback(
+                    encoder_output, prompt, tokenizer, options
+                )
 
-                    # fast-forward to the next segment boundary
-                    seek += segment_size
-                    continue
+                if options.no_speech_threshold is not None:
+                    # no voice activity check
+                    should_skip = result.no_speech_prob > options.no_speech_threshold
 
-            tokens = result.sequences_ids[0]
+                    if (
+                        options.log_prob_threshold is not None
+                        and avg_logprob > options.log_prob_threshold
+                    ):
+                        # don't skip if the logprob is high enough, despite the no_speech_prob
+                        should_skip = False
+
+                    if should_skip:
+                        self.logger.debug(
+                            "No speech threshold is met (%f > %f)",
+                            result.no_speech_prob,
+                            options.no_speech_threshold,
+                        )
 
-            previous_seek = seek
-
-            # anomalous words are very long/short/improbable
-            def word_anomaly_score(word: dict) -> float:
-                probability = word.get("probability", 0.0)
-                duration = word["end"] - word["start"]
-                score = 0.0
-                if probability < 0.15:
-                    score += 1.0
-                if duration < 0.133:
-                    score += (0.133 - duration) * 15
-                if duration > 2.0:
-                    score += duration - 2.0
-                return score
-
-            def is_segment_anomaly(segment: Optional[dict]) -> bool:
-                if segment is None or not segment["words"]:
-                    return False
-                words = [w for w in segment["words"] if w["word"] not in punctuation]
-                words = words[:8]
-                score = sum(word_anomaly_score(w) for w in words)
-                return score >= 3 or score + 0.01 >= len(words)
-
-            def next_words_segment(segments: List[dict]) -> Optional[dict]:
-                return next((s for s in segments if s["words"]), None)
+                        # fast-forward to the next segment boundary
+                        seek += segment_size
+                        continue
+
+                tokens = result.sequences_ids[0]
+
+                previous_seek = seek
+
+                # anomalous words are very long/short/improbable
+                def word_anomaly_score(word: dict) -> float:
+                    probability = word.get("probability", 0.0)
+                    duration = word["end"] - word["start"]
+                    score = 0.0
+                    if probability < 0.15:
+                        score += 1.0
+                    if duration < 0.133:
+                        score += (0.133 - duration) * 15
+                    if duration > 2.0:
+                        score += duration - 2.0
+                    return score
+
+                def is_segment_anomaly(segment: Optional[dict]) -> bool:
+                    if segment is None or not segment["words"]:
+                        return False
+                    words = [
+                        w for w in segment["words"] if w["word"] not in punctuation
+                    ]
+                    words = words[:8]
+                    score = sum(word_anomaly_score(w) for w in words)
+                    return score >= 3 or score + 0.01 >= len(words)
+
+                def next_words_segment(segments: List[dict]) -> Optional[dict]:
+                    return next((s for s in segments if s["words"]), None)
 
-            (
-                current_segments,
-                seek,
-                single_timestamp_ending,
-            ) = self._split_segments_by_timestamps(
-                tokenizer=tokenizer,
-                tokens=tokens,
-                time_offset=time_offset,
-                segment_size=segment_size,
-                segment_duration=segment_duration,
-                seek=seek,
-            )
-
-            if options.word_timestamps:
-                self.add_word_timestamps(
-                    [current_segments],
-                    tokenizer,
-                    encoder_output,
-                    segment_size,
-                    options.prepend_punctuations,
-                    options.append_punctuations,
-                    last_speech_timestamp=last_speech_timestamp,
+                (
+                    current_segments,
+                    seek,
+                    single_timestamp_ending,
+                ) = self._split_segments_by_timestamps(
+                    tokenizer=tokenizer,
+                    tokens=tokens,
+                    time_offset=time_offset,
+                    segment_size=segment_size,
+                    segment_duration=segment_duration,
+                    seek=seek,
                 )
-                if not single_timestamp_ending:
-                    last_word_end = get_end(current_segments)
-                    if last_word_end is not None and last_word_end > time_offset:
-                        seek = round(last_word_end * self.frames_per_second)
-
-                # skip silence before possible hallucinations
-                if options.hallucination_silence_threshold is not None:
-                    threshold = options.hallucination_silence_threshold
-
-                    # if first segment might be a hallucination, skip leading silence
-                    first_segment = next_words_segment(current_segments)
-                    if first_segment is not None and is_segment_anomaly(first_segment):
-                        gap = first_segment["start"] - time_offset
-                        if gap > threshold:
-                            seek = previous_seek + round(gap * self.frames_per_second)
-                            continue
 
-                    # skip silence before any possible hallucination that is surrounded
-                    # by silence or more hallucinations
-                    hal_last_end = last_speech_timestamp
-                    for si in range(len(current_segments)):
-                        segment = current_segments[si]
-                        if not segment["words"]:
-                            continue
-                        if is_segment_anomaly(segment):
-                            next_segment = next_words_segment(
-                                current_segments[si + 1 :]
-                            )
-                            if next_segment is not None:
-                                hal_next_start = next_segment["words"][0]["start"]
-                            else:
-                                hal_next_start = time_offset + segment_duration
-                            silence_before = (
-                                segment["start"] - hal_last_end > threshold
-                                or segment["start"] < threshold
-                                or segment["start"] - time_offset < 2.0
-                            )
-                            silence_after = (
-                                hal_next_start - segment["end"] > threshold
-                                or is_segment_anomaly(next_segment)
-                                or window_end_time - segment["end"] < 2.0
-                            )
-                            if silence_before and silence_after:
-                                seek = round(
-                                    max(time_offset + 1, segment["start"])
-                                    * self.frames_per_second
+                if options.word_timestamps:
+                    self.add_word_timestamps(
+                        [current_segments],
+                        tokenizer,
+                        encoder_output,
+                        segment_size,
+                        options.prepend_punctuations,
+                        options.append_punctuations,
+                        last_speech_timestamp=last_speech_timestamp,
+                    )
+                    if not single_timestamp_ending:
+                        last_word_end = get_end(current_segments)
+                        if last_word_end is not None and last_word_end > time_offset:
+                            seek = round(last_word_end * self.frames_per_second)
+
+                    # skip silence before possible hallucinations
+                    if options.hallucination_silence_threshold is not None:
+                        threshold = options.hallucination_silence_threshold
+
+                        # if first segment might be a hallucination, skip leading silence
+                        first_segment = next_words_segment(current_segments)
+                        if first_segment is not None and is_segment_anomaly(
+                            first_segment
+                        ):
+                            gap = first_segment["start"] - time_offset
+                            if gap > threshold:
+                                seek = previous_seek + round(
+                                    gap * self.frames_per_second
                                 )
-                                if content_duration - segment["end"] < threshold:
-                                    seek = content_frames
-                                current_segments[si:] = []
-                                break
-                        hal_last_end = segment["end"]
-
-                last_word_end = get_end(current_segments)
-                if last_word_end is not None:
-                    last_speech_timestamp = last_word_end
-            for segment in current_segments:
-                tokens = segment["tokens"]
-                text = tokenizer.decode(tokens)
-
-                if segment["start"] == segment["end"] or not text.strip():
-                    continue
+                                continue
+
+                        # skip silence before any possible hallucination that is surrounded
+                        # by silence or more hallucinations
+                        hal_last_end = last_speech_timestamp
+                        for si in range(len(current_segments)):
+                            segment = current_segments[si]
+                            if not segment["words"]:
+                                continue
+                            if is_segment_anomaly(segment):
+                                next_segment = next_words_segment(
+                                    current_segments[si + 1 :]
+                                )
+                                if next_segment is not None:
+                                    hal_next_start = next_segment["words"][0]["start"]
+                                else:
+                                    hal_next_start = time_offset + segment_duration
+                                silence_before = (
+                                    segment["start"] - hal_last_end > threshold
+                                    or segment["start"] < threshold
+                                    or segment["start"] - time_offset < 2.0
+                                )
+                                silence_after = (
+                                    hal_next_start - segment["end"] > threshold
+                                    or is_segment_anomaly(next_segment)
+                                    or window_end_time - segment["end"] < 2.0
+                                )
+                                if silence_before and silence_after:
+                                    seek = round(
+                                        max(time_offset + 1, segment["start"])
+                                        * self.frames_per_second
+                                    )
+                                    if content_duration - segment["end"] < threshold:
+                                        seek = content_frames
+                                    current_segments[si:] = []
+                                    break
+                            hal_last_end = segment["end"]
 
-                all_tokens.extend(tokens)
-                idx += 1
+                    last_word_end = get_end(current_segments)
+                    if last_word_end is not None:
+                        last_speech_timestamp = last_word_end
+                for segment in current_segments:
+                    tokens = segment["tokens"]
+                    text = tokenizer.decode(tokens)
 
-                yield Segment(
-                    id=idx,
-                    seek=previous_seek,
-                    start=segment["start"],
-                    end=segment["end"],
-                    text=text,
-                    tokens=tokens,
-                    temperature=temperature,
-                    avg_logprob=avg_logprob,
-                    compression_ratio=compression_ratio,
-                    no_speech_prob=result.no_speech_prob,
-                    words=(
-                        [Word(**word) for word in segment["words"]]
-                        if options.word_timestamps
-                        else None
-                    ),
-                )
+                    if segment["start"] == segment["end"] or not text.strip():
+                        continue
 
-            if (
-                not options.condition_on_previous_text
-                or temperature > options.prompt_reset_on_temperature
-            ):
-                if options.condition_on_previous_text:
-                    self.logger.debug(
-                        "Reset prompt. prompt_reset_on_temperature threshold is met %f > %f",
-                        temperature,
-                        options.prompt_reset_on_temperature,
+                    all_tokens.extend(tokens)
+                    idx += 1
+
+                    yield Segment(
+                        id=idx,
+                        seek=previous_seek,
+                        start=segment["start"],
+                        end=segment["end"],
+                        text=text,
+                        tokens=tokens,
+                        temperature=temperature,
+                        avg_logprob=avg_logprob,
+                        compression_ratio=compression_ratio,
+                        no_speech_prob=result.no_speech_prob,
+                        words=(
+                            [Word(**word) for word in segment["words"]]
+                            if options.word_timestamps
+                            else None
+                        ),
                     )
 
-                prompt_reset_since = len(all_tokens)
+                if (
+                    not options.condition_on_previous_text
+                    or temperature > options.prompt_reset_on_temperature
+                ):
+                    if options.condition_on_previous_text:
+                        self.logger.debug(
+                            "Reset prompt. prompt_reset_on_temperature threshold is met %f > %f",
+                            temperature,
+                            options.prompt_reset_on_temperature,
+                        )
+
+                    prompt_reset_since = len(all_tokens)
 
-            pbar.update(
-                (min(content_frames, seek) - previous_seek)
-                * self.feature_extractor.time_per_frame,
-            )
-        pbar.close()
+                pbar.update(
+                    (min(content_frames, seek) - previous_seek)
+                    * self.feature_extractor.time_per_frame,
+                )
+        finally:
+            if encoder_executor is not None:
+                encoder_executor.shutdown(wait=False)
+            pbar.close()
+        return seek
 
     def encode(self, features: np.ndarray) -> ctranslate2.StorageView:
         # When the model is running on multiple GPUs, the encoder output should be moved
@@ -1387,7 +1889,7 @@ class WhisperModel:
                 f"so that their combined length is less that {self.max_length}."
             )
 
-        for temperature in options.temperatures:
+        def generate(temperature, asynchronous=False):
             if temperature > 0:
                 kwargs = {
                     "beam_size": 1,
@@ -1401,7 +1903,7 @@ class WhisperModel:
                     "patience": options.patience,
                 }
 
-            result = self.model.generate(
+            return self.model.generate(
                 encoder_output,
                 [prompt],
                 length_penalty=options.length_penalty,
@@ -1413,9 +1915,28 @@ class WhisperModel:
                 suppress_blank=options.suppress_blank,
                 suppress_tokens=options.suppress_tokens,
                 max_initial_timestamp_index=max_initial_timestamp_index,
+                asynchronous=asynchronous,
                 **kwargs,
             )[0]
 
+        # Speculative decodings submitted ahead of the temperature that needs them.
+        pending = {}
+
+        for index, temperature in enumerate(options.temperatures):
+            if options.speculative_fallback > 0:
+                last_index = min(
+                    index + options.speculative_fallback,
+                    len(options.temperatures) - 1,
+                )
+                for next_index in range(index, last_index + 1):
+                    if next_index not in pending:
+                        pending[next_index] = generate(
+                            options.temperatures[next_index], asynchronous=True
+                        )
+                result = pending.pop(index).result()
+            else:
+                result = generate(temperature)
+
             tokens = result.sequences_ids[0]
 
             # Recover the average log prob from the returned score.
@@ -1673,10 +2194,9 @@ class WhisperModel:
         )
         return_list = []
         for result, text_token in zip(results, text_tokens):
-            text_token_probs = result.text_token_probs
-            alignments = result.alignments
-            text_indices = np.array([pair[0] for pair in alignments])
-            time_indices = np.array([pair[1] for pair in alignments])
+            alignments = np.array(result.alignments, dtype=np.int64).reshape(-1, 2)
+            text_indices = alignments[:, 0]
+            time_indices = alignments[:, 1]
 
             words, word_tokens = tokenizer.split_to_word_tokens(
                 text_token + [tokenizer.eot]
@@ -1702,10 +2222,11 @@ class WhisperModel:
             jump_times = time_indices[jumps] / self.tokens_per_second
             start_times = jump_times[word_boundaries[:-1]]
             end_times = jump_times[word_boundaries[1:]]
-            word_probabilities = [
-                np.mean(text_token_probs[i:j])
-                for i, j in zip(word_boundaries[:-1], word_boundaries[1:])
-            ]
+            # Mean probability of the tokens of each word, in a single pass.
+            text_token_probs = np.asarray(result.text_token_probs, dtype=np.float64)
+            word_probabilities = np.add.reduceat(
+                text_token_probs[: word_boundaries[-1]], word_boundaries[:-1]
+            ) / np.diff(word_boundaries)
 
             return_list.append(
                 [
@@ -1717,7 +2238,11 @@ class WhisperModel:
                         probability=probability,
                     )
                     for word, tokens, start, end, probability in zip(
-                        words, word_tokens, start_times, end_times, word_probabilities
+                        words,
+                        word_tokens,
+                        start_times.tolist(),
+                        end_times.tolist(),
+                        word_probabilities.tolist(),
                     )
                 ]
             )
@@ -1731,15 +2256,20 @@ class WhisperModel:
         vad_parameters: Union[dict, VadOptions] = None,
         language_detection_segments: int = 1,
         language_detection_threshold: float = 0.5,
-    ) -> Tuple[str, float, List[Tuple[str, float]]]:
+        return_encoder_output: bool = False,
+    ) -> Union[
+        Tuple[str, float, List[Tuple[str, float]]],
+        Tuple[str, float, List[Tuple[str, float]], ctranslate2.StorageView],
+    ]:
         """
         Use Whisper to detect the language of the input audio or features.
 
         Arguments:
             audio: Input audio signal, must be a 1D float array sampled at 16khz.
             features: Input Mel spectrogram features, must be a float array with
-                shape (n_mels, n_frames), if `audio` is provided, the features will be ignored.
-                Either `audio` or `features` must be provided.
+                shape (n_mels, n_frames) or a stack of 30-second windows with shape
+                (n_windows, n_mels, 3000), if `audio` is provided, the features will be
+                ignored. Either `audio` or `features` must be provided.
             vad_filter: Enable the voice activity detection (VAD) to filter out parts of the audio
                 without speech. This step is using the Silero VAD model.
             vad_parameters: Dictionary of Silero VAD parameters or VadOptions class (see available
@@ -1747,11 +2277,19 @@ class WhisperModel:
             language_detection_threshold: If the maximum probability of the language tokens is
                 higher than this value, the language is detected.
             language_detection_segments: Number of segments to consider for the language detection.
+            return_encoder_output: Also return the encoder output of the first 30-second
+                window, so that it can be reused to decode this window.
+
+        The first window is classified alone and the remaining ones in a single batch.
+        The first window, in order, whose top probability exceeds the threshold decides
+        the language, otherwise the probabilities of all windows are averaged.
 
         Returns:
             language: Detected language.
             languege_probability: Probability of the detected language.
             all_language_probs: List of tuples with all language names and probabilities.
+            encoder_output: Encoder output of the first window, only returned when
+                `return_encoder_output` is set.
         """
         assert (
             audio is not None or features is not None
@@ -1760,42 +2298,69 @@ class WhisperModel:
         if audio is not None:
             if vad_filter:
                 speech_chunks = get_speech_timestamps(audio, vad_parameters)
-                audio_chunks, chunks_metadata = collect_chunks(audio, speech_chunks)
-                audio = np.concatenate(audio_chunks, axis=0)
+                audio = gather_chunks(audio, speech_chunks)
 
             audio = audio[
                 : language_detection_segments * self.feature_extractor.n_samples
             ]
             features = self.feature_extractor(audio)
 
-        features = features[
-            ..., : language_detection_segments * self.feature_extractor.nb_max_frames
-        ]
-
-        detected_language_info = {}
-        for i in range(0, features.shape[-1], self.feature_extractor.nb_max_frames):
-            encoder_output = self.encode(
-                pad_or_trim(features[..., i : i + self.feature_extractor.nb_max_frames])
-            )
-            # results is a list of tuple[str, float] with language names and probabilities.
-            results = self.model.detect_language(encoder_output)[0]
+        nb_max_frames = self.feature_extractor.nb_max_frames
+        if features.ndim == 3:
+            windows = features[:language_detection_segments]
+        else:
+            features = features[..., : language_detection_segments * nb_max_frames]
+            windows = [
+                pad_or_trim(features[..., i : i + nb_max_frames])
+                for i in range(0, features.shape[-1], nb_max_frames)
+            ]
 
-            # Parse language names to strip out markers
-            all_language_probs = [(token[2:-2], prob) for (token, prob) in results]
+        # The first window is encoded alone: most files are detected on it, and its
+        # encoder output can be reused for decoding. The other windows are encoded
+        # and classified in a single batch.
+        first_encoder_output = self.encode(windows[0])
+        # results is a list of tuple[str, float] with language names and probabilities.
+        results = self.model.detect_language(first_encoder_output)
+        if len(windows) > 1 and results[0][0][1] <= language_detection_threshold:
+            encoder_output = self.encode(np.stack(windows[1:]))
+            results.extend(self.model.detect_language(encoder_output))
+
+        # Parse language names to strip out markers
+        window_language_probs = [
+            [(token[2:-2], prob) for (token, prob) in window_results]
+            for window_results in results
+        ]
+        for all_language_probs in window_language_probs:
             # Get top language token and probability
             language, language_probability = all_language_probs[0]
             if language_probability > language_detection_threshold:
                 break
-            detected_language_info.setdefault(language, []).append(language_probability)
         else:
-            # If no language detected for all segments, the majority vote of the highest
-            # projected languages for all segments is used to determine the language.
-            language = max(
-                detected_language_info,
-                key=lambda lang: len(detected_language_info[lang]),
+            # If no window is confident enough, the language with the largest
+            # probability mass over all windows is used.
+            probability_mass = {}
+            for window_probs in window_language_probs:
+                for window_language, prob in window_probs:
+                    probability_mass[window_language] = (
+                        probability_mass.get(window_language, 0) + prob
+                    )
+            all_language_probs = sorted(
+                (
+                    (window_language, mass / len(window_language_probs))
+                    for window_language, mass in probability_mass.items()
+                ),
+                key=lambda item: item[1],
+                reverse=True,
             )
-            language_probability = max(detected_language_info[language])
+            language, language_probability = all_language_probs[0]
 
+        if return_encoder_output:
+            return (
+                language,
+                language_probability,
+                all_language_probs,
+                first_encoder_output,
+            )
         return language, language_probability, all_language_probs
 
 
@@ -1828,6 +2393,51 @@ def restore_speech_timestamps(
         yield segment
 
 
+def _is_audio_stream(audio) -> bool:
+    return not isinstance(audio, (str, bytes, os.PathLike, np.ndarray)) and not hasattr(
+        audio, "read"
+    )
+
+
+def _read_audio_blocks(
+    audio_stream: Iterator[np.ndarray], num_samples: int
+) -> np.ndarray:
+    blocks = []
+    while num_samples > 0:
+        block = next(audio_stream, None)
+        if block is None:
+            break
+        block = np.asarray(block, dtype=np.float32)
+        blocks.append(block)
+        num_samples -= block.shape[0]
+    if not blocks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(blocks)
+
+
+def _drop_word_tokens(
+    tokenizer: Tokenizer, tokens: List[int], words: List[Word]
+) -> List[int]:
+    """Removes the text tokens of the leading `words` from the tokens of a segment.
+
+    The tokens are returned unchanged when the words are not decoded from the first
+    text tokens of the segment, e.g. when the alignment moved a word across segments.
+    """
+    dropped = "".join(word.word for word in words).encode("utf-8")
+    dropped_indices = set()
+    text = b""
+    for index, token in enumerate(tokens):
+        if len(text) >= len(dropped):
+            break
+        if token < tokenizer.eot:
+            dropped_indices.add(index)
+            text += tokenizer.token_bytes[token]
+
+    if text != dropped:
+        return tokens
+    return [token for index, token in enumerate(tokens) if index not in dropped_indices]
+
+
 def get_ctranslate2_storage(segment: np.ndarray) -> ctranslate2.StorageView:
     segment = np.ascontiguousarray(segment)
     segment = ctranslate2.StorageView.from_array(segment)
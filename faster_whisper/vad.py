@@ -2,6 +2,7 @@ import bisect
 import functools
 import os
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
@@ -32,6 +33,11 @@ class VadOptions:
       min_silence_duration_ms: In the end of each speech chunk wait for min_silence_duration_ms
         before separating it
       speech_pad_ms: Final speech chunks are padded by speech_pad_ms each side
+      num_shards: Number of shards the audio is split into to run the VAD in parallel.
+        The shards are decoded along the batch axis of the model and the encoder runs on
+        several threads. With 1, the audio is processed as a single sequence.
+      shard_overlap_s: Audio decoded before each shard to warm up the recurrent state of
+        the model. The speech probabilities of this overlap are discarded.
     """
 
     threshold: float = 0.5
@@ -40,6 +46,8 @@ class VadOptions:
     max_speech_duration_s: float = float("inf")
     min_silence_duration_ms: int = 2000
     speech_pad_ms: int = 400
+    num_shards: int = 1
+    shard_overlap_s: float = 30.0
 
 
 def get_speech_timestamps(
@@ -86,34 +94,93 @@ def get_speech_timestamps(
     padded_audio = np.pad(
         audio, (0, window_size_samples - audio.shape[0] % window_size_samples)
     )
-    speech_probs = model(padded_audio.reshape(1, -1)).squeeze(0)
+    if vad_options.num_shards > 1:
+        speech_probs = model.sharded(
+            padded_audio,
+            vad_options.num_shards,
+            int(vad_options.shard_overlap_s * sampling_rate) // window_size_samples,
+        )
+    else:
+        speech_probs = model(padded_audio.reshape(1, -1)).squeeze(0)
+
+    if neg_threshold is None:
+        neg_threshold = max(threshold - 0.15, 0.01)
+
+    # Only a few frames can change the state of the segmentation below: the first
+    # speech frame after a silence, the first silent frame after speech, the frames
+    # where a silence becomes long enough, and the frame where the maximum speech
+    # duration is reached. They are found from the runs of thresholded probabilities,
+    # and the frames in between are skipped.
+    num_frames = len(speech_probs)
+    speech_runs = _FrameRuns(speech_probs >= threshold)
+    silence_runs = _FrameRuns(speech_probs < neg_threshold)
+
+    def first_frame_after(position, samples, inclusive=False):
+        # First frame i such that `window_size_samples * i - position` exceeds
+        # (or reaches) `samples`, with the same comparison as the per-frame checks.
+        if samples == float("inf"):
+            return num_frames
+
+        def passed(i):
+            delta = window_size_samples * i - position
+            return delta >= samples if inclusive else delta > samples
+
+        i = max(int((position + samples) // window_size_samples), 0)
+        while i > 0 and passed(i - 1):
+            i -= 1
+        while not passed(i):
+            i += 1
+        return min(i, num_frames)
 
     triggered = False
     speeches = []
     current_speech = {}
-    if neg_threshold is None:
-        neg_threshold = max(threshold - 0.15, 0.01)
 
     # to save potential segment end (and tolerate some silence)
     temp_end = 0
     # to save potential segment limits in case of maximum segment size reached
     prev_end = next_start = 0
 
-    for i, speech_prob in enumerate(speech_probs):
+    i = 0
+    while i < num_frames:
+        if not triggered:
+            i = speech_runs.next(i)
+        else:
+            event = max(
+                i, first_frame_after(current_speech["start"], max_speech_samples)
+            )
+            if not temp_end:
+                event = min(event, silence_runs.next(i))
+            else:
+                event = min(event, speech_runs.next(i))
+                silence_event = first_frame_after(
+                    temp_end, min_silence_samples, inclusive=True
+                )
+                if prev_end != temp_end:
+                    silence_event = min(
+                        silence_event,
+                        first_frame_after(temp_end, min_silence_samples_at_max_speech),
+                    )
+                event = min(event, silence_runs.next(max(i, silence_event)))
+            i = event
+        if i >= num_frames:
+            break
+
+        speech_prob = speech_probs[i]
+        frame_start = window_size_samples * i
+        i += 1
+
         if (speech_prob >= threshold) and temp_end:
             temp_end = 0
             if next_start < prev_end:
-                next_start = window_size_samples * i
+                next_start = frame_start
 
         if (speech_prob >= threshold) and not triggered:
             triggered = True
-            current_speech["start"] = window_size_samples * i
+            current_speech["start"] = frame_start
             continue
 
-        if (
-            triggered
-            and (window_size_samples * i) - current_speech["start"] > max_speech_samples
-        ):
+        if triggered and frame_start - current_speech["start"] > max_speech_samples:
             if prev_end:
                 current_speech["end"] = prev_end
                 speeches.append(current_speech)
@@ -125,7 +192,7 @@ def get_speech_timestamps(
                     current_speech["start"] = next_start
                 prev_end = next_start = temp_end = 0
             else:
-                current_speech["end"] = window_size_samples * i
+                current_speech["end"] = frame_start
                 speeches.append(current_speech)
                 current_speech = {}
                 prev_end = next_start = temp_end = 0
@@ -134,11 +201,11 @@ def get_speech_timestamps(
 
         if (speech_prob < neg_threshold) and triggered:
             if not temp_end:
-                temp_end = window_size_samples * i
+                temp_end = frame_start
             # condition to avoid cutting in very short silence
-            if (window_size_samples * i) - temp_end > min_silence_samples_at_max_speech:
+            if frame_start - temp_end > min_silence_samples_at_max_speech:
                 prev_end = temp_end
-            if (window_size_samples * i) - temp_end < min_silence_samples:
+            if frame_start - temp_end < min_silence_samples:
                 continue
             else:
                 current_speech["end"] = temp_end
@@ -158,31 +225,52 @@ def get_speech_timestamps(
         current_speech["end"] = audio_length_samples
         speeches.append(current_speech)
 
-    for i, speech in enumerate(speeches):
-        if i == 0:
-            speech["start"] = int(max(0, speech["start"] - speech_pad_samples))
-        if i != len(speeches) - 1:
-            silence_duration = speeches[i + 1]["start"] - speech["end"]
-            if silence_duration < 2 * speech_pad_samples:
-                speech["end"] += int(silence_duration // 2)
-                speeches[i + 1]["start"] = int(
-                    max(0, speeches[i + 1]["start"] - silence_duration // 2)
-                )
-            else:
-                speech["end"] = int(
-                    min(audio_length_samples, speech["end"] + speech_pad_samples)
-                )
-                speeches[i + 1]["start"] = int(
-                    max(0, speeches[i + 1]["start"] - speech_pad_samples)
-                )
-        else:
-            speech["end"] = int(
-                min(audio_length_samples, speech["end"] + speech_pad_samples)
-            )
+    if not speeches:
+        return speeches
+
+    # Pad the chunks, sharing the silence between two chunks closer than twice
+    # the padding.
+    starts = np.array([speech["start"] for speech in speeches], dtype=np.float64)
+    ends = np.array([speech["end"] for speech in speeches], dtype=np.float64)
+    silence_durations = starts[1:] - ends[:-1]
+    shared = silence_durations < 2 * speech_pad_samples
+    half_silences = silence_durations // 2
+
+    padded_starts = np.maximum(starts - speech_pad_samples, 0)
+    padded_starts[1:] = np.where(
+        shared, np.maximum(starts[1:] - half_silences, 0), padded_starts[1:]
+    )
+    padded_ends = np.minimum(ends + speech_pad_samples, audio_length_samples)
+    padded_ends[:-1] = np.where(shared, ends[:-1] + half_silences, padded_ends[:-1])
+
+    speeches = [
+        {"start": start, "end": end}
+        for start, end in zip(
+            padded_starts.astype(np.int64).tolist(),
+            padded_ends.astype(np.int64).tolist(),
+        )
+    ]
 
     return speeches
 
 
+class _FrameRuns:
+    """Runs of consecutive frames where a condition holds."""
+
+    def __init__(self, mask: np.ndarray):
+        edges = np.flatnonzero(np.diff(mask.astype(np.int8), prepend=0, append=0))
+        self.starts = edges[::2].tolist()
+        self.ends = edges[1::2].tolist()
+        self.num_frames = len(mask)
+
+    def next(self, index: int) -> int:
+        """Returns the first frame at or after index in a run, or the number of frames."""
+        run = bisect.bisect_right(self.ends, index)
+        if run == len(self.ends):
+            return self.num_frames
+        return max(index, self.starts[run])
+
+
 def collect_chunks(
     audio: np.ndarray, chunks: List[dict], sampling_rate: int = 16000
 ) -> Tuple[List[np.ndarray], List[Dict[str, int]]]:
@@ -206,6 +294,17 @@ def collect_chunks(
     return audio_chunks, chunks_metadata
 
 
+def gather_chunks(audio: np.ndarray, chunks: List[dict]) -> np.ndarray:
+    """Copies the audio chunks into a single contiguous float32 array."""
+    spans = [(chunk["start"], min(chunk["end"], audio.shape[0])) for chunk in chunks]
+    gathered = np.empty(sum(end - start for start, end in spans), dtype=np.float32)
+    offset = 0
+    for start, end in spans:
+        gathered[offset : offset + end - start] = audio[start:end]
+        offset += end - start
+    return gathered
+
+
 class SpeechTimestampsMap:
     """Helper class to restore original speech timestamps."""
 
@@ -291,40 +390,204 @@ class SileroVADModel:
         batch_size = audio.shape[0]
 
         state = np.zeros((2, batch_size, 128), dtype="float32")
-        context = np.zeros(
-            (batch_size, context_size_samples),
-            dtype="float32",
-        )
 
+        batched_audio = self._add_context(audio, num_samples, context_size_samples)
+        encoder_output = self.encode(batched_audio).reshape(batch_size, -1, 128)
+        out, _ = self.decode(encoder_output, state)
+        return out
+
+    @staticmethod
+    def _add_context(
+        audio: np.ndarray, num_samples: int, context_size_samples: int
+    ) -> np.ndarray:
+        batch_size = audio.shape[0]
         batched_audio = audio.reshape(batch_size, -1, num_samples)
         context = batched_audio[..., -context_size_samples:]
         context[:, -1] = 0
         context = np.roll(context, 1, 1)
         batched_audio = np.concatenate([context, batched_audio], 2)
+        return batched_audio.reshape(-1, num_samples + context_size_samples)
 
-        batched_audio = batched_audio.reshape(-1, num_samples + context_size_samples)
-
-        encoder_batch_size = 10000
-        num_segments = batched_audio.shape[0]
-        encoder_outputs = []
-        for i in range(0, num_segments, encoder_batch_size):
-            encoder_output = self.encoder_session.run(
-                None, {"input": batched_audio[i : i + encoder_batch_size]}
-            )[0]
-            encoder_outputs.append(encoder_output)
+    def sharded(
+        self,
+        audio: np.ndarray,
+        num_shards: int,
+        overlap_windows: int,
+        num_samples: int = 512,
+        context_size_samples: int = 64,
+    ) -> np.ndarray:
+        """Speech probabilities of a long 1D audio computed over parallel shards.
+
+        The encoder has no state, so its windows are split between threads. The
+        recurrent decoder runs the shards along the batch axis, each shard starting
+        `overlap_windows` before its own range to warm up the state and ending as far
+        after it. Consecutive shards are stitched within the overlap where their
+        probabilities agree best, which closely matches the serial result.
+        """
+        # Shards much shorter than the overlap would mostly decode the overlap.
+        num_windows = audio.shape[0] // num_samples
+        num_shards = min(num_shards, num_windows // max(1, 4 * overlap_windows))
+        if num_shards <= 1:
+            return self(audio.reshape(1, -1), num_samples, context_size_samples)[0]
+
+        batched_audio = self._add_context(
+            audio.reshape(1, -1), num_samples, context_size_samples
+        )
+        shard_size = -(-num_windows // num_shards)
+        with ThreadPoolExecutor(num_shards) as executor:
+            encoder_output = np.concatenate(
+                list(
+                    executor.map(
+                        self.encode,
+                        [
+                            batched_audio[i : i + shard_size]
+                            for i in range(0, num_windows, shard_size)
+                        ],
+                    )
+                )
+            )
 
-        encoder_output = np.concatenate(encoder_outputs, axis=0)
-        encoder_output = encoder_output.reshape(batch_size, -1, 128)
+        encoder_output = encoder_output.reshape(num_windows, 128)
+
+        # Each shard starts `overlap_windows` before its range and runs as far past
+        # it, so that two estimates exist around every boundary.
+        boundaries = list(range(0, num_windows, shard_size))
+        starts = [max(0, boundary - overlap_windows) for boundary in boundaries]
+        sequence_length = min(num_windows, shard_size + 2 * overlap_windows)
+        shards = np.zeros((len(starts), sequence_length, 128), dtype=np.float32)
+        for shard, start in enumerate(starts):
+            window_output = encoder_output[start : start + sequence_length]
+            shards[shard, : window_output.shape[0]] = window_output
+
+        state = np.zeros((2, len(starts), 128), dtype="float32")
+        out, _ = self.decode(shards, state)
+
+        # Stitch where the warmed-up shard agrees best with the previous one, which
+        # has the longer history.
+        speech_probs = np.empty(num_windows, dtype=np.float32)
+        position = 0
+        for shard in range(1, len(starts)):
+            boundary = boundaries[shard]
+            end = min(
+                num_windows,
+                boundary + overlap_windows,
+                starts[shard - 1] + sequence_length,
+            )
+            previous = out[
+                shard - 1, boundary - starts[shard - 1] : end - starts[shard - 1]
+            ]
+            current = out[shard, boundary - starts[shard] : end - starts[shard]]
+            stitch = (
+                boundary + int(np.argmin(np.abs(previous - current)))
+                if end > boundary
+                else boundary
+            )
+            speech_probs[position:stitch] = out[
+                shard - 1, position - starts[shard - 1] : stitch - starts[shard - 1]
+            ]
+            position = stitch
+        speech_probs[position:] = out[
+            -1, position - starts[-1] : num_windows - starts[-1]
+        ]
+        return speech_probs
+
+    def encode(self, windows: np.ndarray, batch_size: int = 10000) -> np.ndarray:
+        """Runs the encoder on windows of shape (n_windows, context + num_samples)."""
+        if windows.shape[0] <= batch_size:
+            return self.encoder_session.run(None, {"input": windows})[0]
+        return np.concatenate(
+            [
+                self.encoder_session.run(None, {"input": windows[i : i + batch_size]})[
+                    0
+                ]
+                for i in range(0, windows.shape[0], batch_size)
+            ],
+            axis=0,
+        )
 
-        decoder_outputs = []
-        for window in np.split(encoder_output, encoder_output.shape[1], axis=1):
-            out, state = self.decoder_session.run(
-                None, {"input": window.squeeze(1), "state": state}
+    def decode(
+        self, encoder_output: np.ndarray, state: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Runs the recurrent decoder over encoder outputs of shape (batch, n_windows, 128).
+
+        Returns the speech probabilities with shape (batch, n_windows) and the final
+        decoder state. All the streams of the batch advance in a single session call
+        per window, so decoding several streams costs little more than one.
+        """
+        batch_size, num_windows = encoder_output.shape[:2]
+        out = np.empty((batch_size, num_windows), dtype=np.float32)
+        run = self.decoder_session.run
+        for i in range(num_windows):
+            window_out, state = run(
+                None, {"input": encoder_output[:, i], "state": state}
             )
-            decoder_outputs.append(out)
+            out[:, i] = window_out[:, 0, 0]
+        return out, state
+
+    def batch(
+        self, audios: List[np.ndarray], num_samples: int = 512
+    ) -> List[np.ndarray]:
+        """Speech probabilities of several independent audios decoded along the batch axis."""
+        num_windows = [-(-audio.shape[0] // num_samples) for audio in audios]
+        batched_audio = np.zeros(
+            (len(audios), max(num_windows, default=0) * num_samples), dtype=np.float32
+        )
+        for i, audio in enumerate(audios):
+            batched_audio[i, : audio.shape[0]] = audio
+        # The model is causal, so the padding does not change the earlier windows.
+        out = self(batched_audio, num_samples) if batched_audio.shape[1] else None
+        return [
+            out[i, :n] if n else np.zeros(0, np.float32)
+            for i, n in enumerate(num_windows)
+        ]
+
+
+class SileroVADStream:
+    """Incremental Silero VAD for live audio.
+
+    The decoder state and the audio context are kept between calls, so that feeding
+    the audio in arbitrary pieces gives the same probabilities as a single call on
+    the whole signal. Samples that do not fill a complete window are kept for the
+    next call.
+    """
 
-        out = np.stack(decoder_outputs, axis=1).squeeze(-1)
-        return out
+    def __init__(
+        self,
+        model: Optional[SileroVADModel] = None,
+        num_samples: int = 512,
+        context_size_samples: int = 64,
+    ):
+        self.model = model or get_vad_model()
+        self.num_samples = num_samples
+        self.context_size_samples = context_size_samples
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros((2, 1, 128), dtype="float32")
+        self.context = np.zeros(self.context_size_samples, dtype="float32")
+        self.remainder = np.zeros(0, dtype="float32")
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        """Returns the speech probability of each window completed by `samples`."""
+        audio = np.concatenate([self.remainder, samples.astype(np.float32, copy=False)])
+        num_windows = audio.shape[0] // self.num_samples
+        self.remainder = audio[num_windows * self.num_samples :]
+        if num_windows == 0:
+            return np.zeros(0, dtype="float32")
+
+        windows = audio[: num_windows * self.num_samples].reshape(
+            num_windows, self.num_samples
+        )
+        context = np.concatenate(
+            [self.context[None], windows[:-1, -self.context_size_samples :]]
+        )
+        self.context = windows[-1, -self.context_size_samples :].copy()
+
+        encoder_output = self.model.encode(np.concatenate([context, windows], 1))
+        out, self.state = self.model.decode(
+            encoder_output.reshape(1, num_windows, 128), self.state
+        )
+        return out[0]
 
 
 def merge_segments(segments_list, vad_options: VadOptions, sampling_rate: int = 16000):
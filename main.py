@@ -2,18 +2,25 @@ import requests
 import torch
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from faster_whisper import WhisperModel
 from deep_translator import GoogleTranslator
+from faster_whisper import BatchedInferencePipeline, open_audio
 import os
-import subprocess
 import threading
+import queue
 import customtkinter as ctk
 import time
 import datetime
-import sounddevice as sd
-import soundfile as sf
+from collections import namedtuple
 
+from cache import TranscriptCache, TranslationCache
+from model_cache import ModelRegistry, estimate_batch_size
 from search import SearchableDropdown
+from streaming import StreamingTranscriber
+from translation import TranslationPipeline
+from ui_bus import UIUpdateBus
+
+# Retained per segment for display and SRT export
+TranscriptSegment = namedtuple("TranscriptSegment", ["start", "end", "text"])
 
 # Set appearance mode and default color theme
 ctk.set_appearance_mode("System")
@@ -34,12 +41,19 @@ class GumzoAIApp(ctk.CTk):
         self.lang_var = tk.StringVar(value="None")
         self.processing = False
         self.stream_var = tk.BooleanVar(value=True)
+        self.fast_batch_var = tk.BooleanVar(value=True)
+        self.throughput_var = tk.StringVar(value="")
         self.segments = []
         self.transcription = ""
         self.translation = ""
         self.cancel_processing = False
         self.streaming_buffer = []
         self.audio_duration = 0
+        self.ui_bus = UIUpdateBus(self)
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model_registry = ModelRegistry()
+        self.translation_cache = TranslationCache()
+        self.transcript_cache = TranscriptCache()
 
         # New: Input source selection variable ("File" or "Realtime")
         self.input_source_var = tk.StringVar(value="File")
@@ -108,6 +122,10 @@ class GumzoAIApp(ctk.CTk):
 
         # Create UI
         self.create_ui()
+        self.ui_bus.start()
+
+        # Warm up the default model in the background so the first job starts quickly
+        self.model_registry.preload(self.get_model_key(), self.device, warm_up=True)
 
     def create_ui(self):
         # Create a scrollable frame
@@ -182,6 +200,7 @@ class GumzoAIApp(ctk.CTk):
         self.model_info_text.pack(padx=10, pady=5, anchor="w")
         self.update_model_info()
         self.model_var.trace_add("write", lambda *args: self.update_model_info())
+        self.model_var.trace_add("write", lambda *args: self.preload_selected_model())
 
         # Buttons
         button_frame = ctk.CTkFrame(main_frame)
@@ -207,6 +226,14 @@ class GumzoAIApp(ctk.CTk):
         )
         self.cancel_btn.pack(side="left", padx=10, pady=10)
         self.cancel_btn.configure(state="disabled")
+        fast_batch_switch = ctk.CTkSwitch(
+            button_frame,
+            text="Fast batch",
+            variable=self.fast_batch_var,
+            onvalue=True,
+            offvalue=False
+        )
+        fast_batch_switch.pack(side="left", padx=10, pady=10)
 
         # Progress
         self.progress_frame = ctk.CTkFrame(main_frame)
@@ -214,6 +241,9 @@ class GumzoAIApp(ctk.CTk):
         self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
         self.progress_bar.pack(pady=5, fill="x", padx=10)
         self.progress_bar.set(0)
+        throughput_label = ctk.CTkLabel(self.progress_frame, textvariable=self.throughput_var,
+                                        font=ctk.CTkFont(size=12))
+        throughput_label.pack(padx=10, anchor="e")
 
         # Results
         results_frame = ctk.CTkFrame(main_frame)
@@ -285,6 +315,17 @@ class GumzoAIApp(ctk.CTk):
         info = descriptions.get(model_key, "Good balance of speed and accuracy")
         self.model_info_text.configure(text=f"Selected: {model_name}{lang_info}\n{info}")
 
+    def get_model_key(self):
+        return self.model_friendly_names.get(self.model_var.get(), "small")
+
+    def preload_selected_model(self):
+        self.model_registry.preload(self.get_model_key(), self.device)
+
+    def load_model(self, model_key):
+        if not self.model_registry.is_loaded(model_key, self.device):
+            self.ui_bus.set_variable(self.status_var, f"Loading model on {self.device}...")
+        return self.model_registry.get(model_key, self.device)
+
     def browse_file(self):
         file_path = filedialog.askopenfilename(
             filetypes=[("Media Files", "*.wav;*.mp3;*.ogg;*.m4a;*.mp4;*.mkv;*.avi;*.mov")])
@@ -306,6 +347,7 @@ class GumzoAIApp(ctk.CTk):
         self.cancel_processing = False
         self.streaming_buffer = []
         self.progress_bar.set(0.0)
+        self.throughput_var.set("")
 
         self.process_btn.configure(state="disabled")
         self.cancel_btn.configure(state="normal")
@@ -330,155 +372,227 @@ class GumzoAIApp(ctk.CTk):
             self.cancel_processing = True
             self.status_var.set("Cancelling...")
 
-    def estimate_total_duration(self, audio_path):
+    def start_translation(self, target_lang, min_chars=1000):
+        """Checks that the translation service is usable and starts a translation pipeline.
+
+        The translations are appended to the translation box as they complete.
+        """
         try:
-            result = subprocess.run([
-                "ffprobe", "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                audio_path
-            ], capture_output=True, text=True)
-            return float(result.stdout.strip())
-        except:
-            return 60  # Fallback duration
+            requests.get("https://www.google.com", timeout=5)
+        except requests.ConnectionError:
+            self.ui_bus.append_text(self.translation_text, "Translation requires internet connection")
+            return None
 
-    def process_media(self):
         try:
-            if self.file_path.lower().endswith(('.mp4', '.mkv', '.avi', '.mov')):
-                self.status_var.set("Converting video to audio...")
-                audio_path = self.file_path.rsplit(".", 1)[0] + ".wav"
-                subprocess.run(
-                    ["ffmpeg", "-i", self.file_path, "-q:a", "0", "-map", "a", audio_path, "-y"],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-                )
-            else:
-                audio_path = self.file_path
+            supported_langs = GoogleTranslator().get_supported_languages(as_dict=True)
+        except Exception as e:
+            error_msg = f"Translation failed: {str(e)}\nPossible causes:\n- Service timeout\n- Invalid API response\n- Daily quota exceeded"
+            self.ui_bus.append_text(self.translation_text, error_msg)
+            return None
+        if target_lang not in supported_langs.values():
+            self.ui_bus.append_text(self.translation_text, f"Unsupported language: {target_lang}")
+            return None
+
+        self.translation_cache.reset_stats()
+        return TranslationPipeline(
+            target_lang,
+            cache=self.translation_cache,
+            min_chars=min_chars,
+            on_result=lambda text: self.ui_bus.append_text(self.translation_text, text + "\n"),
+        )
 
-            self.audio_duration = self.estimate_total_duration(audio_path)
-            model_key = self.model_friendly_names.get(self.model_var.get(), "small")
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.status_var.set(f"Loading model on {device}...")
-            default = os.path.join(os.path.expanduser("~"), ".cache")
-            download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "gumzo")
-            os.makedirs(download_root, exist_ok=True)
-            model = WhisperModel(model_key, device=device, download_root=download_root)
+    def process_media(self):
+        try:
+            model_key = self.get_model_key()
 
             lang_selection = self.lang_var.get()
             target_lang = None if lang_selection == "None" else lang_selection.split("(")[-1].strip(")")
             is_english_model = ".en" in model_key
             language = "en" if is_english_model else None
 
-            self.status_var.set("Processing file...")
-            self.progress_bar.set(0.1)
-            segment_generator, info = model.transcribe(
-                audio_path,
-                language=language,
-                beam_size=5
-            )
-            segments = list(segment_generator)
-            full_transcription = " ".join([seg.text for seg in segments])
-            self.transcript_text.insert("end", full_transcription)
-            self.progress_bar.set(0.8)
+            # Re-opening a file with the same model and options reuses the previous
+            # transcription, only the translation is run again.
+            fast_batch = self.fast_batch_var.get()
+            cache_key = self.transcript_cache.make_key(
+                self.file_path, model_key, language, {"beam_size": 5, "fast_batch": fast_batch})
+            cached = self.transcript_cache.get(cache_key)
+
+            started = time.perf_counter()
+            if cached is not None:
+                cached_segments, total_duration = cached
+                self.audio_duration = total_duration
+                self.ui_bus.set_variable(self.status_var, "Using cached transcription...")
+                segment_generator = (TranscriptSegment(*segment) for segment in cached_segments)
+            else:
+                model = self.load_model(model_key)
+
+                # Audio and video containers are decoded directly by PyAV, which also
+                # provides the duration from the container metadata.
+                audio, self.audio_duration = open_audio(self.file_path)
+
+                self.ui_bus.set_variable(self.status_var, "Processing file...")
+                started = time.perf_counter()
+                if fast_batch:
+                    # VAD-chunked batched decoding: many 30 s chunks per generate call
+                    batch_size = estimate_batch_size(model_key, self.device)
+                    self.ui_bus.set_variable(self.status_var, f"Processing file (fast batch, batch size {batch_size})...")
+                    pipeline = BatchedInferencePipeline(model)
+                    segment_generator, info = pipeline.transcribe(
+                        audio,
+                        language=language,
+                        beam_size=5,
+                        batch_size=batch_size,
+                        # The VAD of long files runs as a few parallel shards
+                        vad_parameters={"min_silence_duration_ms": 160, "num_shards": min(4, os.cpu_count() or 1)}
+                    )
+                else:
+                    segment_generator, info = model.transcribe(
+                        audio,
+                        language=language,
+                        beam_size=5
+                    )
+            # Translation runs concurrently and consumes the segments as they are decoded
+            translator = self.start_translation(target_lang) if target_lang else None
+
+            # Consume the segments lazily and hand them to the Tk thread through the UI bus
+            stream_text = self.stream_var.get()
+            progress_scale = 0.8 if translator is not None else 1.0
+            segments = []
+            texts = []
+            for segment in segment_generator:
+                # Only the fields needed for display and export are retained
+                segments.append(TranscriptSegment(segment.start, segment.end, segment.text))
+                texts.append(segment.text)
+                if translator is not None:
+                    translator.add(segment.text)
+                if stream_text:
+                    self.ui_bus.append_text(self.transcript_text, segment.text if len(texts) == 1 else " " + segment.text)
+                duration = self.audio_duration or (total_duration if cached is not None else info.duration)
+                if duration:
+                    self.ui_bus.set_progress(self.progress_bar, progress_scale * min(1.0, segment.end / duration))
+                elapsed = time.perf_counter() - started
+                if elapsed > 0 and cached is None:
+                    self.ui_bus.set_variable(self.throughput_var, f"{segment.end / elapsed:.1f}x realtime")
+                if self.cancel_processing:
+                    segment_generator.close()
+                    break
+
+            elapsed = time.perf_counter() - started
+            if cached is None:
+                # The duration of a streamed input is only final once all its blocks were read.
+                total_duration = info.duration
+            if cached is not None:
+                self.ui_bus.set_variable(self.throughput_var, "cached transcription")
+            elif not self.cancel_processing:
+                self.transcript_cache.put(cache_key, segments, total_duration)
+                if elapsed > 0:
+                    self.ui_bus.set_variable(self.throughput_var, f"{total_duration / elapsed:.1f}x realtime "
+                                                                  f"({total_duration:.0f}s of audio in {elapsed:.0f}s)")
+            full_transcription = " ".join(texts)
+            if not stream_text:
+                self.ui_bus.append_text(self.transcript_text, full_transcription)
+            self.ui_bus.set_progress(self.progress_bar, progress_scale)
 
             translated_text = ""
-            if target_lang and full_transcription.strip():
-                try:
-                    try:
-                        requests.get("https://www.google.com", timeout=5)
-                    except requests.ConnectionError:
-                        self.translation_text.insert("end", "Translation requires internet connection")
-                        return
-
-                    supported_langs = GoogleTranslator().get_supported_languages(as_dict=True)
-                    if target_lang not in supported_langs.values():
-                        self.translation_text.insert("end", f"Unsupported language: {target_lang}")
-                        return
-
-                    chunk_size = 4500
-                    chunks = [full_transcription[i:i + chunk_size] for i in range(0, len(full_transcription), chunk_size)]
-                    total_chunks = len(chunks)
-                    translated_chunks = []
-
-                    self.status_var.set(f"Translating 0/{total_chunks} chunks...")
-                    self.progress_bar.set(0.8)
-
-                    for i, chunk in enumerate(chunks):
-                        if self.cancel_processing:
-                            break
-                        try:
-                            translated = GoogleTranslator(source="auto", target=target_lang).translate(chunk)
-                            translated_chunks.append(translated)
-                        except Exception as e:
-                            translated_chunks.append(f"\n[TRANSLATION ERROR IN CHUNK {i + 1}: {str(e)}]\n")
-                        progress = 0.8 + (0.2 * (i + 1) / total_chunks)
-                        self.progress_bar.set(progress)
-                        self.status_var.set(f"Translating {i + 1}/{total_chunks} chunks...")
-                        time.sleep(1.5)
-                    translated_text = " ".join(translated_chunks)
-                    self.translation_text.insert("end", translated_text)
-                except Exception as e:
-                    error_msg = f"Translation failed: {str(e)}\nPossible causes:\n- Service timeout\n- Invalid API response\n- Daily quota exceeded"
-                    self.translation_text.insert("end", error_msg)
+            if translator is not None:
+                if self.cancel_processing:
+                    translator.cancel()
+                else:
+                    # Most chunks were already translated while decoding, wait for the rest.
+                    translator.flush()
+                    while translator.completed < translator.submitted and not self.cancel_processing:
+                        self.ui_bus.set_variable(
+                            self.status_var, f"Translating {translator.completed}/{translator.submitted} chunks...")
+                        self.ui_bus.set_progress(
+                            self.progress_bar, 0.8 + 0.2 * translator.completed / translator.submitted)
+                        time.sleep(0.1)
+                    if self.cancel_processing:
+                        translator.cancel()
+                    else:
+                        translated_text = " ".join(translator.finish())
 
             self.segments = segments
             self.transcription = full_transcription.strip()
             self.translation = translated_text.strip()
-            self.progress_bar.set(1.0)
-            self.status_var.set("Processing complete!" if not self.cancel_processing else "Processing cancelled")
+            if not self.cancel_processing:
+                self.ui_bus.set_progress(self.progress_bar, 1.0)
+            status = "Processing complete!" if not self.cancel_processing else "Processing cancelled"
+            if translator is not None:
+                status += f" (translation cache: {self.translation_cache.stats()})"
+            self.ui_bus.set_variable(self.status_var, status)
         except Exception as e:
-            self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Processing failed: {str(e)}")
+            self.ui_bus.set_variable(self.status_var, f"Error: {str(e)}")
+            self.ui_bus.show_error("Error", f"Processing failed: {str(e)}")
         finally:
             self.processing = False
-            self.process_btn.configure(state="normal")
-            self.cancel_btn.configure(state="disabled")
+            self.ui_bus.call(self.process_btn.configure, state="normal")
+            self.ui_bus.call(self.cancel_btn.configure, state="disabled")
 
     def realtime_transcription(self):
+        engine = None
         try:
-            sample_rate = 16000
-            duration = 5
-            model_key = self.model_friendly_names.get(self.model_var.get(), "small")
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.status_var.set(f"Loading model on {device} for realtime transcription...")
-            default = os.path.join(os.path.expanduser("~"), ".cache")
-            download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "gumzo")
-            os.makedirs(download_root, exist_ok=True)
-            model = WhisperModel(model_key, device=device, download_root=download_root)
-            self.status_var.set("Realtime transcription started. Speak into your microphone...")
-            while not self.cancel_processing:
-                self.status_var.set("Recording...")
-                recording = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='float32')
-                sd.wait()
-                temp_audio_path = "temp_realtime.wav"
-                sf.write(temp_audio_path, recording, sample_rate)
-                self.status_var.set("Transcribing...")
-                segment_generator, info = model.transcribe(temp_audio_path, language=None, beam_size=5)
-                segments = list(segment_generator)
-                if segments:
-                    chunk_text = " ".join([seg.text for seg in segments])
-                    self.transcript_text.insert("end", chunk_text + "\n")
-                    self.transcript_text.see("end")
-                    lang_selection = self.lang_var.get()
-                    if lang_selection != "None":
-                        target_lang = lang_selection.split("(")[-1].strip(")")
-                        try:
-                            translated = GoogleTranslator(source="auto", target=target_lang).translate(chunk_text)
-                            self.translation_text.insert("end", translated + "\n")
-                            self.translation_text.see("end")
-                        except Exception as e:
-                            self.translation_text.insert("end", f"\n[Translation Error: {str(e)}]\n")
-                            self.translation_text.see("end")
-                time.sleep(0.2)
-            self.status_var.set("Realtime transcription stopped.")
+            model_key = self.get_model_key()
+            model = self.load_model(model_key)
+            committed = queue.Queue()
+            engine = StreamingTranscriber(
+                model,
+                language="en" if ".en" in model_key else None,
+                on_commit=committed.put,
+                on_partial=lambda text: self.ui_bus.set_variable(self.status_var, f"Listening... {text.strip()}"),
+            )
+            engine.start()
+            self.ui_bus.set_variable(self.status_var, "Realtime transcription started. Speak into your microphone...")
+
+            translator = None
+            translator_lang = None
+            while True:
+                try:
+                    text = committed.get(timeout=0.2)
+                except queue.Empty:
+                    if engine is not None and engine.error is not None:
+                        raise engine.error
+                    if not self.cancel_processing:
+                        continue
+                    # Stop the capture and commit the last words before leaving.
+                    engine.stop()
+                    engine = None
+                    text = ""
+                    while not committed.empty():
+                        text += committed.get()
+                    if not text:
+                        break
+
+                self.ui_bus.append_text(self.transcript_text, text)
+
+                # Translate whole sentences rather than every committed word.
+                lang_selection = self.lang_var.get()
+                target_lang = None if lang_selection == "None" else lang_selection.split("(")[-1].strip(")")
+                if target_lang != translator_lang:
+                    if translator is not None:
+                        threading.Thread(target=translator.finish, daemon=True).start()
+                    translator = self.start_translation(target_lang, min_chars=1) if target_lang else None
+                    translator_lang = target_lang
+                if translator is not None:
+                    translator.add(text)
+                    if len(translator.pending) > 200 or self.cancel_processing:
+                        translator.flush()
+
+                if self.cancel_processing and engine is None:
+                    break
+            status = "Realtime transcription stopped."
+            if translator is not None:
+                translator.finish()
+                status += f" (translation cache: {self.translation_cache.stats()})"
+            self.ui_bus.set_variable(self.status_var, status)
         except Exception as e:
-            self.status_var.set(f"Error in realtime transcription: {str(e)}")
-            messagebox.showerror("Realtime Transcription Error", f"{str(e)}")
+            self.ui_bus.set_variable(self.status_var, f"Error in realtime transcription: {str(e)}")
+            self.ui_bus.show_error("Realtime Transcription Error", f"{str(e)}")
         finally:
+            if engine is not None:
+                engine.stop()
             self.processing = False
-            self.process_btn.configure(state="normal")
-            self.cancel_btn.configure(state="disabled")
+            self.ui_bus.call(self.process_btn.configure, state="normal")
+            self.ui_bus.call(self.cancel_btn.configure, state="disabled")
 
     def export_txt(self):
         if not self.transcription:
@@ -0,0 +1,188 @@
+import ctypes
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from faster_whisper import WhisperModel
+
+# Approximate size of the converted (float16) weights on disk, in MB.
+_MODEL_SIZES_MB = {
+    "tiny": 75,
+    "tiny.en": 75,
+    "base": 145,
+    "base.en": 145,
+    "small": 484,
+    "small.en": 484,
+    "medium": 1530,
+    "medium.en": 1530,
+    "large-v1": 3090,
+    "large-v2": 3090,
+    "large-v3": 3090,
+    "large": 3090,
+    "distil-large-v2": 1510,
+    "distil-large-v3": 1510,
+    "distil-medium.en": 789,
+    "distil-small.en": 332,
+    "large-v3-turbo": 1620,
+    "turbo": 1620,
+}
+
+DEFAULT_MEMORY_BUDGET_MB = 8192
+
+
+def get_download_root():
+    """Returns the directory where Gumzo stores downloaded models."""
+    default = os.path.join(os.path.expanduser("~"), ".cache")
+    download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "gumzo")
+    os.makedirs(download_root, exist_ok=True)
+    return download_root
+
+
+def estimate_model_size_mb(model_key, device="cpu", compute_type="default"):
+    """Rough resident size of a loaded model, used for the registry memory budget."""
+    size_mb = _MODEL_SIZES_MB.get(model_key, 1000)
+    # float16 weights are expanded to float32 when the device cannot run float16.
+    if device == "cpu" and compute_type in ("default", "float32"):
+        size_mb *= 2
+    elif compute_type.startswith("int8"):
+        size_mb //= 2
+    return size_mb
+
+
+def get_available_memory_mb(device="cpu"):
+    """Free memory on the device in MB, or None when it cannot be determined."""
+    if device == "cuda":
+        import torch
+
+        free, _ = torch.cuda.mem_get_info()
+        return free // 2**20
+
+    if sys.platform == "win32":
+
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullAvailPhys // 2**20
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2**20
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_batch_size(model_key, device="cpu", compute_type="default"):
+    """Picks a BatchedInferencePipeline batch size that fits in the free memory."""
+    max_batch_size = 16 if device == "cuda" else 8
+    available_mb = get_available_memory_mb(device)
+    if available_mb is None:
+        return 4
+
+    # Activations and decoding state of one 30 s chunk grow with the model size.
+    per_chunk_mb = max(64, estimate_model_size_mb(model_key, device, compute_type) // 8)
+    # Keep half of the free memory for the rest of the system.
+    batch_size = int(available_mb * 0.5 // per_chunk_mb)
+    return max(1, min(batch_size, max_batch_size))
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded WhisperModel instances.
+
+    Models are keyed by (model name, device, compute type) and evicted in least
+    recently used order once the estimated size of the loaded models exceeds the
+    memory budget. The most recently requested model is never evicted.
+    """
+
+    def __init__(self, download_root=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.download_root = download_root or get_download_root()
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def is_loaded(self, model_key, device="cpu", compute_type="default"):
+        with self._lock:
+            return (model_key, device, compute_type) in self._models
+
+    def get(self, model_key, device="cpu", compute_type="default"):
+        """Returns a loaded model, loading it only if it is not cached yet."""
+        key = (model_key, device, compute_type)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model; the others wait for it and reuse it.
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+
+            model = WhisperModel(
+                model_key,
+                device=device,
+                compute_type=compute_type,
+                download_root=self.download_root,
+            )
+            size_mb = estimate_model_size_mb(model_key, device, compute_type)
+
+            with self._lock:
+                self._models[key] = (model, size_mb)
+                self._load_locks.pop(key, None)
+                self._evict()
+        return model
+
+    def preload(self, model_key, device="cpu", compute_type="default", warm_up=False):
+        """Loads a model on a background thread so that the next job starts immediately."""
+
+        def _preload():
+            try:
+                model = self.get(model_key, device, compute_type)
+                if warm_up:
+                    self.warm_up(model)
+            except Exception:
+                # Preloading is best effort, the job will report the error when it runs.
+                pass
+
+        thread = threading.Thread(target=_preload, daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def warm_up(model):
+        """Runs a short dummy transcription to initialize the compute kernels."""
+        silence = np.zeros(model.feature_extractor.sampling_rate, dtype=np.float32)
+        segments, _ = model.transcribe(
+            silence, language="en", beam_size=1, temperature=0.0
+        )
+        for _ in segments:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _evict(self):
+        # Dropping the reference releases the weights once no job is using the model anymore.
+        total_mb = sum(size_mb for _, size_mb in self._models.values())
+        while total_mb > self.memory_budget_mb and len(self._models) > 1:
+            _, (_, size_mb) = self._models.popitem(last=False)
+            total_mb -= size_mb
@@ -0,0 +1,363 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from faster_whisper.vad import SileroVADStream
+
+
+class RingBuffer:
+    """Single-producer/single-consumer float32 ring buffer.
+
+    The audio callback only ever moves the write position and the decoding worker
+    only ever moves the read position, so the two sides never wait on each other.
+    If the reader falls behind by more than the capacity, the oldest samples are
+    dropped and counted in `overruns`.
+    """
+
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        self._written = 0
+        self._read = 0
+        self.overruns = 0
+
+    def write(self, samples):
+        # Samples that do not fit are skipped but still counted as written, so that
+        # the reader sees them as overruns.
+        dropped = max(0, len(samples) - self._capacity)
+        samples = samples[dropped:]
+        count = len(samples)
+        start = (self._written + dropped) % self._capacity
+        first = min(count, self._capacity - start)
+        self._data[start : start + first] = samples[:first]
+        self._data[: count - first] = samples[first:]
+        # Publish the samples only once they are fully copied.
+        self._written += dropped + count
+
+    def read(self):
+        written = self._written
+        available = written - self._read
+        if available > self._capacity:
+            self.overruns += available - self._capacity
+            self._read = written - self._capacity
+            available = self._capacity
+        start = self._read % self._capacity
+        first = min(available, self._capacity - start)
+        samples = np.concatenate(
+            [self._data[start : start + first], self._data[: available - first]]
+        )
+        self._read = written
+        return samples
+
+
+class HypothesisBuffer:
+    """Local agreement policy: a word is committed once two consecutive hypotheses agree on it."""
+
+    def __init__(self):
+        self.committed = []
+        self.previous = []
+        self.last_committed_time = 0.0
+
+    def insert(self, words):
+        # Words are (start, end, text) tuples in absolute stream time.
+        new = [word for word in words if word[0] > self.last_committed_time - 0.1]
+
+        # Drop the words at the start of the new hypothesis that repeat the committed tail.
+        if new and self.committed and abs(new[0][0] - self.last_committed_time) < 1:
+            for n in range(min(len(self.committed), len(new), 5), 0, -1):
+                tail = [_normalize(word[2]) for word in self.committed[-n:]]
+                head = [_normalize(word[2]) for word in new[:n]]
+                if tail == head:
+                    new = new[n:]
+                    break
+
+        commit = []
+        while new and self.previous and _normalize(new[0][2]) == _normalize(
+            self.previous[0][2]
+        ):
+            commit.append(new.pop(0))
+            self.previous.pop(0)
+
+        if commit:
+            self.last_committed_time = commit[-1][1]
+            self.committed.extend(commit)
+        self.previous = new
+        return commit
+
+    def flush(self):
+        """Commits whatever is left of the last hypothesis."""
+        commit = self.previous
+        self.previous = []
+        if commit:
+            self.last_committed_time = commit[-1][1]
+            self.committed.extend(commit)
+        return commit
+
+    def pending(self):
+        return self.previous
+
+    def trim(self, time):
+        self.committed = [word for word in self.committed if word[1] > time]
+
+
+class LanguageTracker:
+    """Sticky language for a stream: detect once, re-detect only when decoding degrades.
+
+    After a confident detection the language is reused for every step. The mean
+    avg_logprob of the recent speech segments is compared with the level measured
+    right after the detection; a sustained drop below `min_logprob` suggests that
+    the speaker switched language and clears it so the next step detects again.
+    Segments that are probably silence are ignored.
+    """
+
+    def __init__(
+        self,
+        language=None,
+        min_probability=0.5,
+        window=4,
+        min_logprob=-1.0,
+        max_drop=0.4,
+        no_speech_threshold=0.6,
+    ):
+        # A language given by the caller is never re-detected.
+        self.fixed = language is not None
+        self.language = language
+        self.probability = 1.0 if self.fixed else 0.0
+        self.min_probability = min_probability
+        self.min_logprob = min_logprob
+        self.max_drop = max_drop
+        self.no_speech_threshold = no_speech_threshold
+        self._scores = deque(maxlen=window)
+        self._baseline = None
+
+    def update_detection(self, language, probability):
+        if probability < self.min_probability:
+            return
+        self.language = language
+        self.probability = probability
+        self._scores.clear()
+        self._baseline = None
+
+    def observe(self, segments):
+        if self.fixed or self.language is None:
+            return
+        for segment in segments:
+            if segment.no_speech_prob < self.no_speech_threshold:
+                self._scores.append(segment.avg_logprob)
+        if len(self._scores) < self._scores.maxlen:
+            return
+
+        score = sum(self._scores) / len(self._scores)
+        if self._baseline is None:
+            self._baseline = score
+        elif score < self.min_logprob and score < self._baseline - self.max_drop:
+            self.language = None
+            self.probability = 0.0
+        else:
+            self._baseline = max(self._baseline, score)
+
+
+class StreamingTranscriber:
+    """Transcribes the microphone continuously without interrupting the capture.
+
+    A sounddevice input stream feeds a ring buffer from its callback while a worker
+    thread decodes the growing audio window directly from memory every `step_s`
+    seconds. Stable words are reported through `on_commit` and the still changing
+    tail of the hypothesis through `on_partial`.
+
+    When no language is given, it is detected on the first steps and then kept by
+    a LanguageTracker, so the steps do not pay for a language detection each.
+
+    With `vad_threshold` set, the captured audio is also gated by an incremental
+    Silero VAD: steps without speech and without a pending hypothesis are not
+    decoded, and the silence is dropped from the window.
+
+    An exception raised while decoding stops the worker and is kept in `error`,
+    which the caller checks while waiting for words.
+    """
+
+    def __init__(
+        self,
+        model,
+        language=None,
+        sample_rate=16000,
+        step_s=0.5,
+        max_buffer_s=15.0,
+        language_detection_segments=1,
+        vad_threshold=0.5,
+        on_commit=None,
+        on_partial=None,
+    ):
+        self.model = model
+        self.language = language
+        self.sample_rate = sample_rate
+        self.step_samples = int(step_s * sample_rate)
+        self.max_buffer_samples = int(max_buffer_s * sample_rate)
+        self.language_detection_segments = language_detection_segments
+        self.vad_threshold = vad_threshold
+        self.on_commit = on_commit
+        self.on_partial = on_partial
+
+        self._ring = RingBuffer(sample_rate * 60)
+        self._audio = np.zeros(0, dtype=np.float32)
+        # Samples read since the window was last joined.
+        self._blocks = []
+        self._offset = 0.0
+        self._hypothesis = HypothesisBuffer()
+        self._language = LanguageTracker(language)
+        self._vad = SileroVADStream() if vad_threshold is not None else None
+        self._prompt_words = []
+        self._stop_event = threading.Event()
+        self._stream = None
+        self._worker = None
+        self.error = None
+
+    @property
+    def overruns(self):
+        return self._ring.overruns
+
+    @property
+    def detected_language(self):
+        return self._language.language
+
+    def start(self):
+        import sounddevice as sd
+
+        self._stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="float32",
+            blocksize=int(self.sample_rate * 0.1),
+            callback=self._audio_callback,
+        )
+        self._stream.start()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+        if self.error is not None:
+            return
+
+        # Decode the audio captured since the last step and commit the remaining words.
+        self._append(self._ring.read())
+        if len(self._window()):
+            self._process()
+        self._emit(self._hypothesis.flush())
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        self._ring.write(indata[:, 0])
+
+    def _run(self):
+        try:
+            self._decode_steps()
+        except Exception as e:
+            self.error = e
+
+    def _decode_steps(self):
+        pending = 0
+        speech = self._vad is None
+        while not self._stop_event.is_set():
+            samples = self._ring.read()
+            if len(samples):
+                self._append(samples)
+                pending += len(samples)
+                if not speech:
+                    speech = bool(np.any(self._vad(samples) >= self.vad_threshold))
+            if pending < self.step_samples:
+                time.sleep(0.02)
+                continue
+            pending = 0
+            if speech or self._hypothesis.pending():
+                self._process()
+            else:
+                self._skip_silence()
+            speech = self._vad is None
+
+    def _append(self, samples):
+        if len(samples):
+            self._blocks.append(samples)
+
+    def _window(self):
+        # The blocks read every 100 ms are joined to the window once per step.
+        if self._blocks:
+            self._audio = np.concatenate([self._audio] + self._blocks)
+            self._blocks = []
+        return self._audio
+
+    def _process(self):
+        prompt = "".join(word[2] for word in self._prompt_words[-50:]).strip()
+        language = self._language.language
+        segments, info = self.model.transcribe(
+            self._window(),
+            language=language,
+            language_detection_segments=self.language_detection_segments,
+            beam_size=1,
+            temperature=0.0,
+            condition_on_previous_text=False,
+            initial_prompt=prompt or None,
+            word_timestamps=True,
+        )
+        segments = list(segments)
+        if language is None:
+            self._language.update_detection(info.language, info.language_probability)
+        else:
+            self._language.observe(segments)
+
+        words = [
+            (self._offset + word.start, self._offset + word.end, word.word)
+            for segment in segments
+            for word in segment.words
+        ]
+
+        self._emit(self._hypothesis.insert(words))
+        if self.on_partial is not None:
+            self.on_partial("".join(word[2] for word in self._hypothesis.pending()))
+
+        if len(self._audio) > self.max_buffer_samples:
+            self._trim()
+
+    def _skip_silence(self):
+        # Everything before the silence is committed: keep only a short tail in case
+        # the speech onset was missed by the VAD.
+        cut_samples = max(0, len(self._window()) - self.step_samples)
+        self._audio = self._audio[cut_samples:]
+        self._offset += cut_samples / self.sample_rate
+        self._hypothesis.trim(self._offset)
+
+    def _trim(self):
+        cut_time = self._hypothesis.last_committed_time
+        if cut_time <= self._offset:
+            # Nothing was stable for a whole window: commit the hypothesis as is.
+            self._emit(self._hypothesis.flush())
+            cut_time = max(
+                self._hypothesis.last_committed_time,
+                self._offset + len(self._audio) / self.sample_rate / 2,
+            )
+
+        cut_samples = int((cut_time - self._offset) * self.sample_rate)
+        self._audio = self._audio[cut_samples:]
+        self._offset += cut_samples / self.sample_rate
+        self._hypothesis.trim(self._offset)
+
+    def _emit(self, words):
+        if not words:
+            return
+        self._prompt_words.extend(words)
+        self._prompt_words = self._prompt_words[-50:]
+        if self.on_commit is not None:
+            self.on_commit("".join(word[2] for word in words))
+
+
+def _normalize(word):
+    return word.strip().lower()
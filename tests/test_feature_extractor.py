@@ -0,0 +1,95 @@
+import numpy as np
+
+from faster_whisper.feature_extractor import FeatureExtractor, StreamingFeatureExtractor
+
+
+def _reference_features(feature_extractor, waveform, padding=160):
+    # Log-Mel spectrogram through the complex64 STFT, as computed before the
+    # float32 rfft path.
+    waveform = waveform.astype(np.float32)
+    if padding:
+        waveform = np.pad(waveform, (0, padding))
+
+    window = np.hanning(feature_extractor.n_fft + 1)[:-1].astype("float32")
+    stft = feature_extractor.stft(
+        waveform,
+        feature_extractor.n_fft,
+        feature_extractor.hop_length,
+        window=window,
+        return_complex=True,
+    ).astype("complex64")
+    magnitudes = np.abs(stft[..., :-1]) ** 2
+
+    mel_spec = feature_extractor.mel_filters @ magnitudes
+    log_spec = np.log10(np.clip(mel_spec, a_min=1e-10, a_max=None))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def test_features_match_complex_stft():
+    feature_extractor = FeatureExtractor()
+    rng = np.random.default_rng(0)
+
+    # Without padding, inputs shorter than a hop have no frame left after
+    # dropping the last one, in both implementations.
+    for num_samples, padding in [
+        (1, 160),
+        (100, 160),
+        (399, 160),
+        (399, 0),
+        (400, 0),
+        (401, 0),
+        (16000, 160),
+        (45 * 16000 + 123, 160),
+        (45 * 16000 + 123, 0),
+    ]:
+        audio = rng.normal(0, 0.1, num_samples).astype(np.float32)
+        features = feature_extractor(audio, padding=padding)
+        expected = _reference_features(feature_extractor, audio, padding=padding)
+        assert features.shape == expected.shape
+        np.testing.assert_allclose(features, expected, rtol=0, atol=1e-5)
+
+
+def test_streaming_features_match_full_audio():
+    feature_extractor = FeatureExtractor()
+    rng = np.random.default_rng(0)
+
+    for num_samples in [1, 100, 200, 201, 399, 400, 16000, 30 * 16000 + 77]:
+        audio = rng.normal(0, 0.1, num_samples).astype(np.float32)
+        expected = feature_extractor(audio)
+        for _ in range(5):
+            # Random block boundaries, including empty blocks.
+            cuts = np.sort(rng.integers(0, num_samples + 1, rng.integers(0, 20)))
+            stream = StreamingFeatureExtractor(feature_extractor)
+            for block in np.split(audio, cuts):
+                stream.append(block)
+            stream.finalize()
+
+            features = stream.features()
+            assert stream.num_frames == expected.shape[-1]
+            assert features.shape == expected.shape
+            np.testing.assert_allclose(features, expected, rtol=0, atol=1e-6)
+
+
+def test_batch_features_match_per_chunk_features():
+    feature_extractor = FeatureExtractor()
+    rng = np.random.default_rng(0)
+    num_frames = feature_extractor.nb_max_frames
+
+    lengths = [1, 100, 399, 400, 401, 16000, 30 * 16000, 30 * 16000 + 500]
+    lengths += list(rng.integers(1, 35 * 16000, 20))
+    chunks = [rng.normal(0, 0.1, length).astype(np.float32) for length in lengths]
+
+    for batch_samples, num_workers in [(None, 1), (None, 4), (5 * 16000, 2)]:
+        features = feature_extractor.batch(
+            chunks, batch_samples=batch_samples, num_workers=num_workers
+        )
+        assert features.shape == (len(chunks), 80, num_frames)
+
+        for row, chunk in zip(features, chunks):
+            expected = feature_extractor(chunk)[..., :-1]
+            length = min(expected.shape[-1], num_frames)
+            np.testing.assert_allclose(
+                row[:, :length], expected[:, :length], rtol=0, atol=1e-5
+            )
+            assert not row[:, length:].any()
@@ -0,0 +1,157 @@
+import threading
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from streaming import (
+    HypothesisBuffer,
+    LanguageTracker,
+    RingBuffer,
+    StreamingTranscriber,
+)
+
+
+def _samples(start, stop):
+    return np.arange(start, stop, dtype=np.float32)
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(8)
+
+    ring.write(_samples(0, 5))
+    np.testing.assert_array_equal(ring.read(), _samples(0, 5))
+
+    # The write position wraps past the end of the buffer.
+    ring.write(_samples(5, 11))
+    np.testing.assert_array_equal(ring.read(), _samples(5, 11))
+    assert len(ring.read()) == 0
+    assert ring.overruns == 0
+
+
+def test_ring_buffer_counts_overruns():
+    ring = RingBuffer(8)
+
+    ring.write(_samples(0, 5))
+    ring.write(_samples(5, 11))
+    np.testing.assert_array_equal(ring.read(), _samples(3, 11))
+    assert ring.overruns == 3
+
+    # A single write larger than the buffer keeps its last samples.
+    ring.write(_samples(11, 31))
+    np.testing.assert_array_equal(ring.read(), _samples(23, 31))
+    assert ring.overruns == 15
+
+    ring.write(_samples(31, 34))
+    np.testing.assert_array_equal(ring.read(), _samples(31, 34))
+
+
+def test_hypothesis_buffer_commits_agreed_words():
+    hypothesis = HypothesisBuffer()
+
+    assert hypothesis.insert([(0.0, 0.5, " Hello"), (0.5, 1.0, " world")]) == []
+    commit = hypothesis.insert(
+        [(0.0, 0.5, " hello"), (0.5, 1.0, " world"), (1.0, 1.5, " again")]
+    )
+
+    assert commit == [(0.0, 0.5, " hello"), (0.5, 1.0, " world")]
+    assert hypothesis.pending() == [(1.0, 1.5, " again")]
+    assert hypothesis.last_committed_time == 1.0
+
+
+def test_hypothesis_buffer_drops_repeated_committed_words():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert([(0.0, 0.5, " Hello"), (0.5, 1.0, " world")])
+    hypothesis.insert(
+        [(0.0, 0.5, " Hello"), (0.5, 1.0, " world"), (1.0, 1.5, " again")]
+    )
+
+    # The next window starts just before the committed end and repeats its last word.
+    commit = hypothesis.insert(
+        [(0.95, 1.0, " world"), (1.0, 1.5, " again"), (1.5, 2.0, " there")]
+    )
+
+    assert commit == [(1.0, 1.5, " again")]
+    assert [word[2] for word in hypothesis.committed] == [" Hello", " world", " again"]
+    assert hypothesis.flush() == [(1.5, 2.0, " there")]
+    assert hypothesis.pending() == []
+
+    hypothesis.trim(1.2)
+    assert [word[2] for word in hypothesis.committed] == [" again", " there"]
+
+
+def _segments(*avg_logprobs, no_speech_prob=0.1):
+    return [
+        SimpleNamespace(avg_logprob=avg_logprob, no_speech_prob=no_speech_prob)
+        for avg_logprob in avg_logprobs
+    ]
+
+
+def test_language_tracker_redetects_on_sustained_logprob_drop():
+    tracker = LanguageTracker(window=2)
+
+    tracker.update_detection("fr", 0.3)
+    assert tracker.language is None
+    tracker.update_detection("en", 0.9)
+    assert tracker.language == "en"
+
+    tracker.observe(_segments(-0.3, -0.3))
+    # A single bad segment is not enough.
+    tracker.observe(_segments(-1.5))
+    assert tracker.language == "en"
+    # Segments that are probably silence are ignored.
+    tracker.observe(_segments(-3.0, -3.0, no_speech_prob=0.9))
+    assert tracker.language == "en"
+
+    tracker.observe(_segments(-1.5))
+    assert tracker.language is None
+    assert tracker.probability == 0.0
+
+
+def test_language_tracker_keeps_a_fixed_language():
+    tracker = LanguageTracker("en", window=2)
+
+    tracker.observe(_segments(-0.3, -0.3))
+    tracker.observe(_segments(-3.0, -3.0))
+
+    assert tracker.language == "en"
+
+
+def test_streaming_transcriber_joins_blocks_once_per_step():
+    windows = []
+
+    def transcribe(audio, **kwargs):
+        windows.append(audio)
+        return iter([]), SimpleNamespace(language="en", language_probability=0.9)
+
+    transcriber = StreamingTranscriber(
+        SimpleNamespace(transcribe=transcribe), vad_threshold=None
+    )
+    for start in range(0, 30, 10):
+        transcriber._append(_samples(start, start + 10))
+    transcriber._process()
+    transcriber._append(_samples(30, 35))
+    transcriber._process()
+
+    np.testing.assert_array_equal(windows[0], _samples(0, 30))
+    np.testing.assert_array_equal(windows[1], _samples(0, 35))
+    assert transcriber.detected_language == "en"
+
+
+def test_streaming_transcriber_reports_decoding_errors():
+    def transcribe(audio, **kwargs):
+        raise RuntimeError("out of memory")
+
+    transcriber = StreamingTranscriber(
+        SimpleNamespace(transcribe=transcribe), step_s=0.01, vad_threshold=None
+    )
+    transcriber._ring.write(_samples(0, 1600))
+    transcriber._worker = threading.Thread(target=transcriber._run, daemon=True)
+    transcriber._worker.start()
+    transcriber._worker.join(10)
+
+    assert not transcriber._worker.is_alive()
+    assert isinstance(transcriber.error, RuntimeError)
+    # Stopping does not decode again with the failing model.
+    transcriber.stop()
+    assert str(transcriber.error) == "out of memory"
@@ -0,0 +1,92 @@
+import numpy as np
+import tokenizers
+
+from tokenizers import decoders, models, pre_tokenizers, trainers
+
+from faster_whisper.tokenizer import Tokenizer
+
+_CORPUS = [
+    "Hello world, how are you today?",
+    "Bonjour à tous, ça va très bien.",
+    "日本語のテキストです。",
+    "Привет, как дела?",
+    "♪♪ música 🎵 con emoji 😀",
+]
+
+
+def _make_tokenizer():
+    # Small byte-level BPE vocabulary followed by the Whisper special tokens.
+    tokenizer = tokenizers.Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=400,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    )
+    tokenizer.train_from_iterator(_CORPUS * 5, trainer)
+    tokenizer.add_special_tokens(
+        [
+            "<|endoftext|>",
+            "<|startoftranscript|>",
+            "<|translate|>",
+            "<|transcribe|>",
+            "<|startoflm|>",
+            "<|startofprev|>",
+            "<|nocaptions|>",
+            "<|notimestamps|>",
+        ]
+    )
+    return Tokenizer(tokenizer, multilingual=False)
+
+
+def _reference_split_tokens_on_unicode(tokenizer, tokens):
+    # Decodes the tokens of the current word again after each token.
+    decoded_full = tokenizer.decode_with_timestamps(tokens)
+    replacement_char = "\ufffd"
+
+    words = []
+    word_tokens = []
+    current_tokens = []
+    unicode_offset = 0
+
+    for token in tokens:
+        current_tokens.append(token)
+        decoded = tokenizer.decode_with_timestamps(current_tokens)
+
+        try:
+            replacement_char_index = decoded.index(replacement_char)
+            replacement_char_index += unicode_offset
+        except ValueError:
+            replacement_char_index = None
+
+        if replacement_char_index is None or (
+            replacement_char_index < len(decoded_full)
+            and decoded_full[replacement_char_index] == replacement_char
+        ):
+            words.append(decoded)
+            word_tokens.append(current_tokens)
+            current_tokens = []
+            unicode_offset += len(decoded)
+
+    return words, word_tokens
+
+
+def test_split_tokens_on_unicode_matches_reference():
+    tokenizer = _make_tokenizer()
+    rng = np.random.default_rng(0)
+
+    sequences = [tokenizer.encode(text) + [tokenizer.eot] for text in _CORPUS]
+    for _ in range(2000):
+        # Random text tokens often cut multi-byte characters, which then decode to
+        # replacement characters.
+        tokens = list(rng.integers(0, tokenizer.eot, rng.integers(0, 30)))
+        for _ in range(rng.integers(0, 4)):
+            timestamp = tokenizer.timestamp_begin + int(rng.integers(0, 1501))
+            tokens.insert(int(rng.integers(0, len(tokens) + 1)), timestamp)
+        sequences.append([int(token) for token in tokens] + [tokenizer.eot])
+
+    for tokens in sequences:
+        assert tokenizer.split_tokens_on_unicode(
+            tokens
+        ) == _reference_split_tokens_on_unicode(tokenizer, tokens)
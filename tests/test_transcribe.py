@@ -0,0 +1,321 @@
+import dataclasses
+import io
+import threading
+
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from faster_whisper import BatchedInferencePipeline, WhisperModel, transcribe
+from faster_whisper.feature_extractor import FeatureExtractor
+from faster_whisper.transcribe import (
+    Segment,
+    TranscriptionOptions,
+    Word,
+    _drop_word_tokens,
+    _is_audio_stream,
+)
+from faster_whisper.vad import VadOptions, get_vad_model
+
+
+def test_is_audio_stream():
+    audio = np.zeros(16000, dtype=np.float32)
+
+    assert not _is_audio_stream("audio.wav")
+    assert not _is_audio_stream(Path("audio.wav"))
+    assert not _is_audio_stream(b"RIFF")
+    assert not _is_audio_stream(io.BytesIO(b"RIFF"))
+    assert not _is_audio_stream(audio)
+
+    assert _is_audio_stream([audio, audio])
+    assert _is_audio_stream(iter([audio]))
+
+
+def _make_model():
+    # The sectioning logic only needs the feature extractor, not the model weights.
+    model = WhisperModel.__new__(WhisperModel)
+    model.feature_extractor = FeatureExtractor()
+    return model
+
+
+def _make_options():
+    return TranscriptionOptions(
+        **{field.name: None for field in dataclasses.fields(TranscriptionOptions)}
+    )
+
+
+def _make_segment(start, end, words=None, tokens=()):
+    if words is not None:
+        words = [Word(start, end, word, 1.0) for word, start, end in words]
+        text = "".join(word.word for word in words)
+    else:
+        text = " segment"
+    return Segment(
+        id=0,
+        seek=0,
+        start=start,
+        end=end,
+        text=text,
+        tokens=list(tokens),
+        avg_logprob=0.0,
+        compression_ratio=1.0,
+        no_speech_prob=0.0,
+        words=words,
+        temperature=0.0,
+    )
+
+
+def _transcribe_sections(
+    model, sections, boundaries, content_seconds=90, tokenizer=None
+):
+    # `sections` maps the start time of a section to a function generating its segments.
+    def generate_segments(
+        features, tokenizer, options, log_progress, encoder_output, stop_event=None
+    ):
+        yield from sections[options.clip_timestamps[0]](stop_event)
+
+    model.generate_segments = generate_segments
+    features = np.zeros((80, content_seconds * 100 + 1), dtype=np.float32)
+    return model._generate_sectioned_segments(
+        features, tokenizer, _make_options(), False, None, boundaries
+    )
+
+
+def test_section_boundaries_are_at_least_a_window():
+    model = _make_model()
+    sampling_rate = model.feature_extractor.sampling_rate
+    audio = np.zeros(95 * sampling_rate, dtype=np.float32)
+    speech_chunks = [
+        dict(start=0, end=length * sampling_rate) for length in (40, 40, 10, 5)
+    ]
+
+    # The silence at 80 s would leave a 15 s last section.
+    boundaries = model._get_section_boundaries(audio, speech_chunks, None, 3)
+    assert boundaries == [4000]
+
+    speech_chunks = [dict(start=0, end=length * sampling_rate) for length in (90, 5)]
+    assert model._get_section_boundaries(audio, speech_chunks, None, 2) == []
+
+
+def test_sectioned_segments_dedupe_boundary_overlap():
+    model = _make_model()
+    sections = {
+        0.0: lambda stop_event: [
+            _make_segment(0.0, 12.0, [(" Hello", 0.0, 5.0), (" world", 5.5, 12.0)]),
+            # The last timestamps run past the end of the section at 30 s.
+            _make_segment(24.0, 31.5, [(" one", 24.0, 28.0), (" two", 29.0, 31.5)]),
+        ],
+        30.0: lambda stop_event: [
+            _make_segment(
+                30.0,
+                36.0,
+                [(" two", 30.0, 31.2), (" three", 31.6, 36.0)],
+                # <|0.00|> " tw" "o" " three" <|6.00|>
+                tokens=[10, 3, 4, 5, 310],
+            ),
+            _make_segment(40.0, 58.0, [(" four", 40.0, 58.0)]),
+        ],
+        60.0: lambda stop_event: [
+            _make_segment(60.0, 70.0, [(" five", 60.0, 70.0)]),
+        ],
+    }
+
+    # The timestamp tokens start after the end of text token.
+    tokenizer = SimpleNamespace(
+        eot=6,
+        token_bytes=[b" Hello", b" world", b" one", b" tw", b"o", b" three", b""],
+    )
+    segments = list(
+        _transcribe_sections(model, sections, [3000, 6000], tokenizer=tokenizer)
+    )
+
+    assert [segment.id for segment in segments] == [1, 2, 3, 4, 5]
+    assert "".join(segment.text for segment in segments) == (
+        " Hello world one two three four five"
+    )
+    assert [word.word for segment in segments for word in segment.words] == [
+        " Hello",
+        " world",
+        " one",
+        " two",
+        " three",
+        " four",
+        " five",
+    ]
+    assert segments[2].start == 31.6
+    assert segments[2].tokens == [10, 5, 310]
+
+
+def test_drop_word_tokens_keeps_unmatched_tokens():
+    tokenizer = SimpleNamespace(eot=3, token_bytes=[b" tw", b"o", b" three", b""])
+    tokens = [4, 0, 1, 2, 104]
+
+    assert _drop_word_tokens(tokenizer, tokens, [Word(0.0, 1.0, " two", 1.0)]) == [
+        4,
+        2,
+        104,
+    ]
+    # The word does not end on a token boundary, or is not at the start.
+    assert _drop_word_tokens(tokenizer, tokens, [Word(0.0, 1.0, " t", 1.0)]) == tokens
+    assert (
+        _drop_word_tokens(tokenizer, tokens, [Word(0.0, 1.0, " three", 1.0)]) == tokens
+    )
+
+
+def test_sectioned_segments_dedupe_without_words():
+    model = _make_model()
+    sections = {
+        0.0: lambda stop_event: [_make_segment(0.0, 10.0), _make_segment(25.0, 32.0)],
+        30.0: lambda stop_event: [_make_segment(30.0, 31.0), _make_segment(31.0, 35.0)],
+    }
+
+    segments = list(_transcribe_sections(model, sections, [3000], 60))
+
+    assert [(segment.start, segment.end) for segment in segments] == [
+        (0.0, 10.0),
+        (25.0, 32.0),
+        (32.0, 35.0),
+    ]
+
+
+def test_sectioned_segments_yield_first_section_live():
+    model = _make_model()
+    release = threading.Event()
+
+    def second_section(stop_event):
+        release.wait(10)
+        yield _make_segment(40.0, 50.0)
+
+    sections = {
+        0.0: lambda stop_event: [_make_segment(0.0, 10.0)],
+        30.0: second_section,
+    }
+
+    segments = _transcribe_sections(model, sections, [3000], 60)
+    assert next(segments).start == 0.0
+    assert not release.is_set()
+
+    release.set()
+    assert [segment.start for segment in segments] == [40.0]
+
+
+def test_sectioned_segments_stop_running_sections_on_close():
+    model = _make_model()
+    started = threading.Event()
+    stopped = threading.Event()
+
+    def second_section(stop_event):
+        started.set()
+        stop_event.wait(10)
+        if stop_event.is_set():
+            stopped.set()
+        yield _make_segment(40.0, 50.0)
+
+    sections = {
+        0.0: lambda stop_event: [_make_segment(0.0, 10.0)],
+        30.0: second_section,
+    }
+
+    segments = _transcribe_sections(model, sections, [3000], 60)
+    next(segments)
+    # Sections that did not start yet are cancelled, this one must be stopped.
+    assert started.wait(10)
+    segments.close()
+
+    assert stopped.wait(10)
+
+
+def test_generate_segments_cleans_up_on_error(monkeypatch):
+    executors = []
+    progress_bars = []
+
+    class RecordingExecutor(transcribe.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.shutdown_called = False
+            executors.append(self)
+
+        def shutdown(self, *args, **kwargs):
+            self.shutdown_called = True
+            super().shutdown(*args, **kwargs)
+
+    class RecordingProgressBar(transcribe.tqdm):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.close_called = False
+            progress_bars.append(self)
+
+        def close(self):
+            self.close_called = True
+            super().close()
+
+    monkeypatch.setattr(transcribe, "ThreadPoolExecutor", RecordingExecutor)
+    monkeypatch.setattr(transcribe, "tqdm", RecordingProgressBar)
+
+    model = _make_model()
+    model.logger = transcribe.get_logger()
+    model.frames_per_second = 100
+    model.encode = lambda features: None
+    model.get_prompt = lambda *args, **kwargs: []
+
+    def generate_with_fallback(encoder_output, prompt, tokenizer, options):
+        raise RuntimeError("decoding failed")
+
+    model.generate_with_fallback = generate_with_fallback
+
+    options = dataclasses.replace(
+        _make_options(),
+        clip_timestamps=[],
+        speculative_encoding=True,
+        multilingual=False,
+    )
+    features = np.zeros((80, 60 * 100 + 1), dtype=np.float32)
+    segments = model.generate_segments(features, None, options, False)
+
+    try:
+        next(segments)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("the decoding error was not raised")
+
+    assert len(executors) == 1 and executors[0].shutdown_called
+    assert len(progress_bars) == 1 and progress_bars[0].close_called
+
+
+def test_streamed_batched_vad_runs_all_shards(monkeypatch):
+    pipeline = BatchedInferencePipeline.__new__(BatchedInferencePipeline)
+    pipeline.model = SimpleNamespace(feature_extractor=FeatureExtractor())
+    monkeypatch.setattr(
+        pipeline, "_batched_segments_generator", lambda *args, **kwargs: iter([])
+    )
+
+    vad_model = get_vad_model()
+    decode = vad_model.decode
+    num_streams = []
+
+    def record_decode(encoder_output, state):
+        num_streams.append(encoder_output.shape[0])
+        return decode(encoder_output, state)
+
+    monkeypatch.setattr(vad_model, "decode", record_decode)
+
+    rng = np.random.default_rng(0)
+    blocks = [rng.normal(0, 0.003, 30 * 16000).astype(np.float32) for _ in range(20)]
+    info = SimpleNamespace(duration=0.0, duration_after_vad=0.0)
+    segments = pipeline._streamed_segments_generator(
+        np.zeros(0, dtype=np.float32),
+        iter(blocks),
+        None,
+        VadOptions(num_shards=4),
+        8,
+        None,
+        False,
+        info,
+    )
+
+    assert list(segments) == []
+    assert info.duration == 600
+    # The first 8 minutes are decoded in 4 shards, the last 2 minutes serially.
+    assert num_streams == [4, 1]
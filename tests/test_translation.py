@@ -0,0 +1,174 @@
+import threading
+import time
+
+import translation
+
+from translation import TranslationPipeline, _find_split
+
+
+class FakeTranslator:
+    def __init__(self, delays=None, failures=0, release=None):
+        self.delays = delays or {}
+        self.failures = failures
+        self.release = release
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def translate(self, text):
+        with self.lock:
+            self.calls.append(text)
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("service unavailable")
+        if self.release is not None:
+            self.release.wait(10)
+        if text in self.delays:
+            time.sleep(self.delays[text])
+        return text.upper()
+
+
+class FakeCache:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, text, target):
+        return self.entries.get((text, target))
+
+    def put(self, text, target, translation):
+        self.entries[(text, target)] = translation
+
+
+def _make_pipeline(translator, **kwargs):
+    kwargs.setdefault("min_chars", 1)
+    kwargs.setdefault("requests_per_second", 1000)
+    kwargs.setdefault("burst", 10)
+    return TranslationPipeline("fr", translator_factory=lambda: translator, **kwargs)
+
+
+def test_results_are_reported_in_order():
+    # The first requests finish last.
+    translator = FakeTranslator(delays={"One.": 0.2, "Two.": 0.1})
+    reported = []
+    pipeline = _make_pipeline(translator, on_result=reported.append)
+
+    for text in ("One.", "Two.", "Three.", "Four."):
+        pipeline.add(text)
+
+    assert pipeline.finish() == ["ONE.", "TWO.", "THREE.", "FOUR."]
+    assert reported == ["ONE.", "TWO.", "THREE.", "FOUR."]
+    assert pipeline.completed == pipeline.submitted == 4
+
+
+def test_text_is_grouped_until_a_sentence_end():
+    translator = FakeTranslator()
+    pipeline = _make_pipeline(translator, min_chars=10)
+
+    pipeline.add("Hello")
+    pipeline.add("there.")
+    pipeline.add("More")
+
+    assert pipeline.submitted == 1
+    assert pipeline.finish() == ["HELLO THERE.", "MORE"]
+
+
+def test_failed_requests_are_retried_with_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(translation.time, "sleep", sleeps.append)
+    monkeypatch.setattr(translation.random, "random", lambda: 0.0)
+    translator = FakeTranslator(failures=2)
+    pipeline = _make_pipeline(translator, max_retries=4, backoff_s=0.5)
+
+    pipeline.add("Hello.")
+
+    assert pipeline.finish() == ["HELLO."]
+    assert translator.calls == ["Hello."] * 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_failed_requests_report_an_error_after_the_last_retry(monkeypatch):
+    monkeypatch.setattr(translation.time, "sleep", lambda seconds: None)
+    translator = FakeTranslator(failures=10)
+    pipeline = _make_pipeline(translator, max_retries=2)
+
+    pipeline.add("Hello.")
+
+    assert pipeline.finish() == ["[TRANSLATION ERROR: service unavailable]"]
+    assert len(translator.calls) == 3
+
+
+def test_cached_translations_are_not_requested():
+    translator = FakeTranslator()
+    cache = FakeCache({("One.", "fr"): "un."})
+    pipeline = _make_pipeline(translator, cache=cache)
+
+    pipeline.add("One.")
+    pipeline.add("Two.")
+
+    assert pipeline.finish() == ["un.", "TWO."]
+    assert translator.calls == ["Two."]
+    assert cache.get("Two.", "fr") == "TWO."
+
+
+def test_cancel_drops_pending_requests():
+    release = threading.Event()
+    translator = FakeTranslator(release=release)
+    pipeline = _make_pipeline(translator, max_workers=1)
+
+    pipeline.add("One.")
+    pipeline.add("Two.")
+    pipeline.add("Three")
+    # Wait for the first request to run, the second one is queued behind it.
+    for _ in range(1000):
+        if translator.calls:
+            break
+        time.sleep(0.01)
+
+    pipeline.cancel()
+    release.set()
+    pipeline._executor.shutdown(wait=True)
+
+    assert pipeline.pending == ""
+    assert translator.calls == ["One."]
+    assert pipeline.completed == 1
+
+
+def test_find_split():
+    text = "First sentence. Second sentence! Third part without end"
+
+    # The last sentence end within the limit is preferred.
+    assert _find_split(text, 40) == len("First sentence. Second sentence! ")
+    # Then the last space.
+    assert _find_split("no sentence end here", 12) == len("no sentence")
+    # Then a hard cut.
+    assert _find_split("abcdefghij", 4) == 4
+
+
+def test_only_missing_segments_are_requested():
+    translator = FakeTranslator()
+    cache = FakeCache({("Hello.", "fr"): "bonjour."})
+    pipeline = _make_pipeline(translator, cache=cache, min_chars=30)
+
+    for text in ("Hello.", "How are you?", "Hello.", "Fine."):
+        pipeline.add(text)
+
+    assert pipeline.finish() == ["bonjour. HOW ARE YOU? bonjour. FINE."]
+    assert translator.calls == ["How are you?\nFine."]
+    assert cache.get("How are you?", "fr") == "HOW ARE YOU?"
+    assert cache.get("Fine.", "fr") == "FINE."
+
+
+def test_segments_are_requested_alone_when_lines_are_merged():
+    class MergingTranslator(FakeTranslator):
+        def translate(self, text):
+            return super().translate(text).replace("\n", " ")
+
+    translator = MergingTranslator()
+    cache = FakeCache()
+    pipeline = _make_pipeline(translator, cache=cache, min_chars=20)
+
+    pipeline.add("How are you?")
+    pipeline.add("Fine.")
+
+    assert pipeline.finish() == ["HOW ARE YOU? FINE."]
+    assert translator.calls == ["How are you?\nFine.", "How are you?", "Fine."]
+    assert cache.get("Fine.", "fr") == "FINE."
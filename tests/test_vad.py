@@ -0,0 +1,236 @@
+import numpy as np
+
+from faster_whisper import vad
+from faster_whisper.vad import VadOptions, get_speech_timestamps, get_vad_model
+
+SAMPLING_RATE = 16000
+
+
+def _voiced(duration, rng):
+    # Harmonic signal with a drifting pitch and syllable-like envelope, which the
+    # VAD model detects as speech.
+    t = np.arange(int(duration * SAMPLING_RATE)) / SAMPLING_RATE
+    f0 = (
+        120 + 20 * np.sin(2 * np.pi * 0.7 * t) + rng.normal(0, 1, t.size).cumsum() / 200
+    )
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLING_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 30))
+    envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)) ** 2
+    return (0.3 * signal * envelope).astype(np.float32)
+
+
+def _make_speech_audio(duration, regions, rng):
+    audio = rng.normal(0, 0.003, duration * SAMPLING_RATE).astype(np.float32)
+    for start, length in regions:
+        start = int(start * SAMPLING_RATE)
+        voiced = _voiced(length, rng)
+        audio[start : start + voiced.shape[0]] += voiced
+    return audio
+
+
+def test_sharded_vad_matches_serial():
+    rng = np.random.default_rng(0)
+    # 8 minutes in 4 shards of 2 minutes, with speech across each shard boundary.
+    boundaries = (120, 240, 360)
+    regions = [(boundary - 2, 4) for boundary in boundaries]
+    position = 2.0
+    while position < 470:
+        length = rng.uniform(2, 5)
+        if all(
+            position + length + 1 < region_start
+            or position > region_start + region_length + 1
+            for region_start, region_length in regions[: len(boundaries)]
+        ):
+            regions.append((position, length))
+        position += length + rng.uniform(1, 10)
+    audio = _make_speech_audio(480, regions, rng)
+
+    padded_audio = np.pad(audio, (0, 512 - audio.shape[0] % 512))
+    model = get_vad_model()
+    serial_probs = model(padded_audio.reshape(1, -1))[0]
+    sharded_probs = model.sharded(padded_audio, 4, 30 * SAMPLING_RATE // 512)
+    # The decoder state of a shard is only warmed up by the overlap, so a few
+    # probabilities differ slightly from the serial ones.
+    errors = np.abs(sharded_probs - serial_probs)
+    assert errors.mean() < 0.005
+    assert errors.max() < 0.2
+
+    serial = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=160))
+    sharded = get_speech_timestamps(
+        audio, VadOptions(min_silence_duration_ms=160, num_shards=4)
+    )
+    assert len(serial) > 40
+    assert len(sharded) == len(serial)
+    for serial_speech, sharded_speech in zip(serial, sharded):
+        assert abs(sharded_speech["start"] - serial_speech["start"]) <= 8 * 512
+        assert abs(sharded_speech["end"] - serial_speech["end"]) <= 8 * 512
+
+    for boundary in boundaries:
+        crossing = [
+            speech
+            for speech in serial
+            if speech["start"] < boundary * SAMPLING_RATE < speech["end"]
+        ]
+        assert len(crossing) == 1
+        assert crossing[0] in sharded
+
+
+def _reference_speech_timestamps(speech_probs, audio_length_samples, vad_options):
+    # Per-frame segmentation loop that get_speech_timestamps used to run.
+    sampling_rate = SAMPLING_RATE
+    threshold = vad_options.threshold
+    neg_threshold = vad_options.neg_threshold
+    window_size_samples = 512
+    min_speech_samples = sampling_rate * vad_options.min_speech_duration_ms / 1000
+    speech_pad_samples = sampling_rate * vad_options.speech_pad_ms / 1000
+    max_speech_samples = (
+        sampling_rate * vad_options.max_speech_duration_s
+        - window_size_samples
+        - 2 * speech_pad_samples
+    )
+    min_silence_samples = sampling_rate * vad_options.min_silence_duration_ms / 1000
+    min_silence_samples_at_max_speech = sampling_rate * 98 / 1000
+
+    triggered = False
+    speeches = []
+    current_speech = {}
+    if neg_threshold is None:
+        neg_threshold = max(threshold - 0.15, 0.01)
+
+    temp_end = 0
+    prev_end = next_start = 0
+
+    for i, speech_prob in enumerate(speech_probs):
+        if (speech_prob >= threshold) and temp_end:
+            temp_end = 0
+            if next_start < prev_end:
+                next_start = window_size_samples * i
+
+        if (speech_prob >= threshold) and not triggered:
+            triggered = True
+            current_speech["start"] = window_size_samples * i
+            continue
+
+        if (
+            triggered
+            and (window_size_samples * i) - current_speech["start"] > max_speech_samples
+        ):
+            if prev_end:
+                current_speech["end"] = prev_end
+                speeches.append(current_speech)
+                current_speech = {}
+                if next_start < prev_end:
+                    triggered = False
+                else:
+                    current_speech["start"] = next_start
+                prev_end = next_start = temp_end = 0
+            else:
+                current_speech["end"] = window_size_samples * i
+                speeches.append(current_speech)
+                current_speech = {}
+                prev_end = next_start = temp_end = 0
+                triggered = False
+                continue
+
+        if (speech_prob < neg_threshold) and triggered:
+            if not temp_end:
+                temp_end = window_size_samples * i
+            if (window_size_samples * i) - temp_end > min_silence_samples_at_max_speech:
+                prev_end = temp_end
+            if (window_size_samples * i) - temp_end < min_silence_samples:
+                continue
+            else:
+                current_speech["end"] = temp_end
+                if (
+                    current_speech["end"] - current_speech["start"]
+                ) > min_speech_samples:
+                    speeches.append(current_speech)
+                current_speech = {}
+                prev_end = next_start = temp_end = 0
+                triggered = False
+                continue
+
+    if (
+        current_speech
+        and (audio_length_samples - current_speech["start"]) > min_speech_samples
+    ):
+        current_speech["end"] = audio_length_samples
+        speeches.append(current_speech)
+
+    for i, speech in enumerate(speeches):
+        if i == 0:
+            speech["start"] = int(max(0, speech["start"] - speech_pad_samples))
+        if i != len(speeches) - 1:
+            silence_duration = speeches[i + 1]["start"] - speech["end"]
+            if silence_duration < 2 * speech_pad_samples:
+                speech["end"] += int(silence_duration // 2)
+                speeches[i + 1]["start"] = int(
+                    max(0, speeches[i + 1]["start"] - silence_duration // 2)
+                )
+            else:
+                speech["end"] = int(
+                    min(audio_length_samples, speech["end"] + speech_pad_samples)
+                )
+                speeches[i + 1]["start"] = int(
+                    max(0, speeches[i + 1]["start"] - speech_pad_samples)
+                )
+        else:
+            speech["end"] = int(
+                min(audio_length_samples, speech["end"] + speech_pad_samples)
+            )
+
+    return speeches
+
+
+class _FixedProbabilitiesModel:
+    def __init__(self, speech_probs):
+        self.speech_probs = speech_probs
+
+    def __call__(self, audio):
+        return self.speech_probs[None]
+
+
+def _random_speech_probs(rng):
+    # Runs of silence, speech, values between the thresholds and noise.
+    num_frames = int(rng.integers(1, 400))
+    speech_probs = np.empty(num_frames, dtype=np.float32)
+    position = 0
+    while position < num_frames:
+        length = int(rng.integers(1, 40))
+        low, high = [(0, 0.3), (0.5, 1), (0.3, 0.5), (0, 1)][rng.integers(0, 4)]
+        run = rng.uniform(low, high, length)
+        speech_probs[position : position + length] = run[: num_frames - position]
+        position += length
+    return speech_probs
+
+
+def test_speech_timestamps_match_per_frame_loop(monkeypatch):
+    rng = np.random.default_rng(0)
+
+    for _ in range(2000):
+        speech_probs = _random_speech_probs(rng)
+        audio_length_samples = (speech_probs.shape[0] - 1) * 512 + int(
+            rng.integers(0, 512)
+        )
+        vad_options = VadOptions(
+            threshold=float(rng.choice([0.3, 0.5, 0.7])),
+            min_speech_duration_ms=int(rng.choice([0, 50, 250])),
+            max_speech_duration_s=float(
+                rng.choice([float("inf"), 2.5, 1.0, 0.5, 0.01])
+            ),
+            min_silence_duration_ms=int(rng.choice([0, 30, 100, 160, 500, 2000])),
+            speech_pad_ms=int(rng.choice([0, 30, 400])),
+        )
+        if rng.random() < 0.2:
+            vad_options.neg_threshold = float(rng.uniform(0, 1))
+
+        monkeypatch.setattr(
+            vad, "get_vad_model", lambda: _FixedProbabilitiesModel(speech_probs)
+        )
+        audio = np.zeros(audio_length_samples, dtype=np.float32)
+
+        assert get_speech_timestamps(audio, vad_options) == (
+            _reference_speech_timestamps(
+                speech_probs, audio_length_samples, vad_options
+            )
+        )
@@ -0,0 +1,221 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from deep_translator import GoogleTranslator
+
+# Google Translate rejects requests longer than 5000 characters.
+MAX_REQUEST_CHARS = 4500
+
+_SENTENCE_END = re.compile(r"[.!?。？！][\"'”’)\]]*\s")
+_SENTENCE_END_CHARS = (".", "!", "?", "。", "？", "！", '"', "'", "”", "’", ")", "]")
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class TranslationPipeline:
+    """Translates a transcript while it is being produced.
+
+    Text is added segment by segment and grouped on sentence boundaries into
+    requests of at most `max_chars` characters. A group is sent as soon as it ends
+    a sentence and holds at least `min_chars` characters, so translation overlaps
+    with transcription. Requests run on a bounded thread pool, are throttled by a
+    token bucket and retried with exponential backoff. Translations are reported
+    through `on_result` in the order of the source text.
+
+    When a `cache` is given, each added segment is looked up on its own: a group
+    only requests the translation of its missing segments, one per line, and the
+    new translations are stored segment by segment.
+
+    `translator_factory` builds the translation client. One client is created per
+    worker thread and reused for all its requests, since the deep_translator
+    clients keep the request parameters as instance state.
+    """
+
+    def __init__(
+        self,
+        target,
+        source="auto",
+        translator_factory=None,
+        cache=None,
+        on_result=None,
+        min_chars=1000,
+        max_chars=MAX_REQUEST_CHARS,
+        max_workers=3,
+        requests_per_second=2.0,
+        burst=3,
+        max_retries=4,
+        backoff_s=1.0,
+    ):
+        self.translator_factory = translator_factory or (
+            lambda: GoogleTranslator(source=source, target=target)
+        )
+        self.target = target
+        self.cache = cache
+        self.on_result = on_result
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+
+        self.pending = ""
+        # (text, cached translation or None) of the segments in `pending`.
+        self._segments = []
+        self.results = []
+        self._bucket = TokenBucket(requests_per_second, burst)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._local = threading.local()
+        self._futures = []
+        self._lock = threading.Lock()
+        self._next_result = 0
+
+    @property
+    def submitted(self):
+        return len(self._futures)
+
+    @property
+    def completed(self):
+        return self._next_result
+
+    def add(self, text):
+        text = text.strip()
+        # Text longer than a request is cut on sentence ends, each piece is cached alone.
+        while len(text) > self.max_chars:
+            cut = _find_split(text, self.max_chars)
+            self._add_segment(text[:cut])
+            text = text[cut:].lstrip()
+        if not text:
+            return
+        self._add_segment(text)
+
+        if len(self.pending) >= self.min_chars and self.pending.endswith(
+            _SENTENCE_END_CHARS
+        ):
+            self.flush()
+
+    def flush(self):
+        """Sends the text added so far, even if it does not end a sentence."""
+        if self._segments:
+            self._submit(self._segments)
+            self._segments = []
+            self.pending = ""
+
+    def finish(self):
+        """Sends the remaining text and waits for all the translations."""
+        self.flush()
+        for future in list(self._futures):
+            future.result()
+        self._executor.shutdown()
+        return self.results
+
+    def cancel(self):
+        self._segments = []
+        self.pending = ""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _add_segment(self, text):
+        if self._segments and len(self.pending) + 1 + len(text) > self.max_chars:
+            self.flush()
+        cached = self.cache.get(text, self.target) if self.cache is not None else None
+        self._segments.append((text, cached))
+        self.pending = f"{self.pending} {text}" if self.pending else text
+
+    def _submit(self, segments):
+        if all(cached is not None for _, cached in segments):
+            future = Future()
+            future.set_result(" ".join(cached for _, cached in segments))
+        else:
+            future = self._executor.submit(self._translate, segments)
+        with self._lock:
+            self._futures.append(future)
+            self.results.append(None)
+        future.add_done_callback(self._on_done)
+
+    def _translate(self, segments):
+        misses = [text for text, cached in segments if cached is None]
+        try:
+            if self.cache is None:
+                return self._request(" ".join(misses))
+            # One segment per line, so that each translation can be cached alone.
+            translations = self._request("\n".join(misses)).split("\n")
+            if len(translations) != len(misses):
+                # The lines were merged, translate the segments one by one.
+                translations = [self._request(text) for text in misses]
+        except Exception as e:
+            return f"[TRANSLATION ERROR: {str(e)}]"
+
+        translations = iter(translations)
+        parts = []
+        for text, cached in segments:
+            if cached is None:
+                cached = next(translations).strip()
+                if self.cache is not None and cached:
+                    self.cache.put(text, self.target, cached)
+            parts.append(cached)
+        return " ".join(part for part in parts if part)
+
+    def _request(self, text):
+        translator = getattr(self._local, "translator", None)
+        if translator is None:
+            translator = self._local.translator = self.translator_factory()
+
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            try:
+                return translator.translate(text)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter so the workers do not retry in lockstep.
+                time.sleep(self.backoff_s * 2**attempt * (1 + random.random()))
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                return
+            # Report the translations in order: a request finishing early waits for
+            # the ones before it.
+            while self._next_result < len(self._futures):
+                current = self._futures[self._next_result]
+                if not current.done() or current.cancelled():
+                    break
+                text = current.result()
+                self.results[self._next_result] = text
+                self._next_result += 1
+                if self.on_result is not None:
+                    self.on_result(text)
+
+
+def _find_split(text, max_chars):
+    # Prefer the last sentence end within the limit, then the last space.
+    cut = 0
+    for match in _SENTENCE_END.finditer(text, 0, max_chars + 1):
+        cut = match.end()
+    if cut == 0:
+        cut = text.rfind(" ", 0, max_chars + 1)
+    return cut if cut > 0 else max_chars
@@ -0,0 +1,93 @@
+import queue
+from collections import namedtuple
+from tkinter import messagebox
+
+AppendText = namedtuple("AppendText", ["widget", "text"])
+SetProgress = namedtuple("SetProgress", ["widget", "value"])
+SetVariable = namedtuple("SetVariable", ["variable", "value"])
+ShowError = namedtuple("ShowError", ["title", "message"])
+Call = namedtuple("Call", ["function", "args", "kwargs"])
+
+
+class UIUpdateBus:
+    """Thread-safe channel for the widget updates posted by worker threads.
+
+    Tk is not thread-safe, so the workers only put typed events on a queue that is
+    drained on the Tk loop once per frame. Consecutive text appends to the same
+    widget are merged into a single insert, and only the last progress value and
+    variable value of a frame are applied.
+    """
+
+    def __init__(self, root, frame_ms=33):
+        self.root = root
+        self.frame_ms = frame_ms
+        self._events = queue.Queue()
+
+    def start(self):
+        self.root.after(self.frame_ms, self._drain)
+
+    def append_text(self, widget, text):
+        if text:
+            self._events.put(AppendText(widget, text))
+
+    def set_progress(self, widget, value):
+        self._events.put(SetProgress(widget, value))
+
+    def set_variable(self, variable, value):
+        self._events.put(SetVariable(variable, value))
+
+    def show_error(self, title, message):
+        self._events.put(ShowError(title, message))
+
+    def call(self, function, *args, **kwargs):
+        """Runs an arbitrary callable on the Tk thread, in order with the other events."""
+        self._events.put(Call(function, args, kwargs))
+
+    def _drain(self):
+        try:
+            self._apply(self._collect())
+        finally:
+            self.root.after(self.frame_ms, self._drain)
+
+    def _collect(self):
+        actions = []
+        latest = {}
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+
+            if isinstance(event, AppendText):
+                last = actions[-1] if actions else None
+                if isinstance(last, AppendText) and last.widget is event.widget:
+                    actions[-1] = AppendText(event.widget, last.text + event.text)
+                    continue
+            elif isinstance(event, (SetProgress, SetVariable)):
+                # Intermediate values would never be visible, keep the last one.
+                latest[(type(event), id(event[0]))] = event
+                continue
+            else:
+                # Dialogs and calls see the state posted before them.
+                actions.extend(latest.values())
+                latest.clear()
+            actions.append(event)
+        return actions + list(latest.values())
+
+    def _apply(self, actions):
+        scrolled = set()
+        for action in actions:
+            if isinstance(action, AppendText):
+                action.widget.insert("end", action.text)
+                scrolled.add(action.widget)
+            elif isinstance(action, SetProgress):
+                action.widget.set(action.value)
+            elif isinstance(action, SetVariable):
+                action.variable.set(action.value)
+            elif isinstance(action, ShowError):
+                messagebox.showerror(action.title, action.message)
+            elif isinstance(action, Call):
+                action.function(*action.args, **action.kwargs)
+
+        for widget in scrolled:
+            widget.see("end")